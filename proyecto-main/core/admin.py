@@ -1,11 +1,27 @@
 from django.contrib import admin
+from .cola import encolar_muchos
 from .models import *
 # Register your models here.
 
+
+@admin.action(description='Aprobar los pagos seleccionados (en segundo plano)')
+def aprobar_pagos(modeladmin, request, queryset):
+    # Cada pago se aprueba en su propia tarea (ver core/tareas.py: finalizar_pago), que también confirma la reserva
+    ids = list(queryset.values_list('id', flat=True))
+    encolar_muchos('finalizar_pago', [{'pago_id': pago_id} for pago_id in ids])
+    modeladmin.message_user(request, f'{len(ids)} pagos quedaron en cola para aprobarse.')
+
+
+class PagoAdmin(admin.ModelAdmin):
+    actions = [aprobar_pagos]
+
+
 admin.site.register(TipoUsuario)
 admin.site.register(Usuario)
 admin.site.register(TipoServicio)
 admin.site.register(Servicio)
+admin.site.register(TarifaTemporada)
+admin.site.register(Descuento)
 admin.site.register(EstadoReserva)
 admin.site.register(Reserva)
 admin.site.register(DetalleReserva)
@@ -13,4 +29,12 @@ admin.site.register(Carrito)
 admin.site.register(DetalleCarrito)
 admin.site.register(MetodoPago)
 admin.site.register(EstadoPago)
-admin.site.register(Pago)
+admin.site.register(Pago, PagoAdmin)
+admin.site.register(Tarea)
+admin.site.register(ReservaArchivada)
+admin.site.register(DetalleReservaArchivado)
+admin.site.register(PagoArchivado)
+admin.site.register(CoocurrenciaServicio)
+admin.site.register(RecomendacionServicio)
+admin.site.register(IndiceRecomendaciones)
+admin.site.register(DetallePendienteRecomendacion)
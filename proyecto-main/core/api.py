@@ -0,0 +1,193 @@
+# core/api.py
+
+import hashlib
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from . import versiones
+from .router import lectura_en_replica
+from .models import Carrito, DetalleCarrito, DetalleReserva, Reserva, Servicio
+
+LIMITE_POR_DEFECTO = 20
+LIMITE_MAXIMO = 100
+
+# Campos que el cliente puede pedir con ?campos=a,b,c (nombre público -> lookup del ORM)
+CAMPOS_SERVICIO = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'descripcion': 'descripcion',
+    'precio': 'precio',
+    'tipo_servicio': 'tipo_servicio__nombre',
+    'anfitrion': 'anfitrion__nombre',
+}
+
+CAMPOS_RESERVA = {
+    'id': 'id',
+    'fecha_reserva': 'fecha_reserva',
+    'fecha_inicio': 'fecha_inicio',
+    'fecha_fin': 'fecha_fin',
+    'estado': 'estado__estado',
+    'total': 'total',
+}
+
+
+def error(mensaje, status):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+def login_requerido_api(vista):
+    """
+    Como @login_required, pero responde 401 en JSON en vez de redirigir al login.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Debes iniciar sesión.', 401)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def elegir_campos(request, disponibles, extras=()):
+    """
+    Interpreta ?campos=... y retorna la lista de nombres públicos pedidos.
+    Lanza ValueError si se pide un campo que no existe.
+    """
+    pedidos = [c.strip() for c in request.GET.get('campos', '').split(',') if c.strip()]
+    if not pedidos:
+        return list(disponibles) + list(extras)
+    desconocidos = set(pedidos) - set(disponibles) - set(extras)
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(desconocidos))}")
+    return pedidos
+
+
+def paginar(request, queryset, campos, mapa, descendente=False):
+    """
+    Paginación por cursor (keyset sobre id): ?cursor=<último id visto>&limite=N.
+    Serializa con values(), sin instanciar modelos.
+    """
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_POR_DEFECTO)), 1), LIMITE_MAXIMO)
+        cursor = int(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError:
+        raise ValueError('Los parámetros cursor y limite deben ser enteros.')
+
+    if cursor is not None:
+        queryset = queryset.filter(id__lt=cursor) if descendente else queryset.filter(id__gt=cursor)
+    queryset = queryset.order_by('-id' if descendente else 'id')
+
+    lookups = {publico: mapa[publico] for publico in campos if publico in mapa}
+    lookups.setdefault('id', 'id') # El id siempre se necesita para el cursor
+    filas = list(queryset.values(*lookups.values())[:limite + 1])
+
+    siguiente = str(filas[limite - 1]['id']) if len(filas) > limite else None
+    resultados = [
+        {publico: fila[lookup] for publico, lookup in lookups.items() if publico in campos}
+        for fila in filas[:limite]
+    ]
+    return resultados, [fila['id'] for fila in filas[:limite]], siguiente
+
+
+def etag_de(claves_func):
+    """
+    Construye el etag_func para @condition: versiones de los recursos que aparecen en la respuesta
+    + URL completa (los parámetros de campos/cursor cambian la representación).
+    `claves_func(request)` retorna una tupla de claves; incluye las de los datos unidos por join
+    (por ejemplo el nombre del servicio dentro del carrito), para que un cambio ahí no dé un 304 viejo.
+    Solo hace una consulta a VersionRecurso, nunca la consulta principal.
+    """
+    def etag_func(request, *args, **kwargs):
+        claves = claves_func(request) if claves_func else (versiones.SERVICIOS,)
+        huella = hashlib.md5(request.get_full_path().encode()).hexdigest()[:12]
+        numeros = '.'.join(str(v) for v in versiones.obtener_versiones(*claves))
+        return f"{'+'.join(claves)}-{numeros}-{huella}"
+    return etag_func
+
+
+# --- Catálogo ---
+
+@require_GET
+@lectura_en_replica
+@condition(etag_func=etag_de(None))
+def servicios(request):
+    try:
+        campos = elegir_campos(request, CAMPOS_SERVICIO)
+        queryset = Servicio.objects.all()
+        if request.GET.get('tipo'):
+            queryset = queryset.filter(tipo_servicio__nombre__iexact=request.GET['tipo'])
+        resultados, ids, siguiente = paginar(request, queryset, campos, CAMPOS_SERVICIO)
+    except ValueError as e:
+        return error(str(e), 400)
+    return JsonResponse({'resultados': resultados, 'siguiente': siguiente})
+
+
+@require_GET
+@lectura_en_replica
+@condition(etag_func=etag_de(None))
+def servicio(request, servicio_id):
+    try:
+        campos = elegir_campos(request, CAMPOS_SERVICIO)
+    except ValueError as e:
+        return error(str(e), 400)
+    lookups = {publico: CAMPOS_SERVICIO[publico] for publico in campos}
+    fila = Servicio.objects.filter(id=servicio_id).values(*lookups.values()).first()
+    if fila is None:
+        return error('Servicio no encontrado.', 404)
+    return JsonResponse({publico: fila[lookup] for publico, lookup in lookups.items()})
+
+
+# --- Carrito ---
+
+@require_GET
+@login_requerido_api
+@condition(etag_func=etag_de(lambda request: (versiones.clave_carrito(request.user.id), versiones.SERVICIOS)))
+def carrito(request):
+    carrito_id = Carrito.objects.filter(usuario=request.user, activo=True).order_by('-id').values_list('id', flat=True).first()
+    items = []
+    if carrito_id:
+        items = list(DetalleCarrito.objects.filter(carrito_id=carrito_id).order_by('id').values(
+            'id', 'cantidad', 'servicio_id', 'servicio__nombre', 'servicio__precio',
+        ))
+        for item in items:
+            item['servicio'] = {
+                'id': item.pop('servicio_id'),
+                'nombre': item.pop('servicio__nombre'),
+                'precio': item.pop('servicio__precio'),
+            }
+    return JsonResponse({'id': carrito_id, 'items': items})
+
+
+# --- Historial de reservas ---
+
+@require_GET
+@login_requerido_api
+@lectura_en_replica
+@condition(etag_func=etag_de(lambda request: (
+    versiones.clave_reservas(request.user.id), versiones.ESTADOS_RESERVA, versiones.SERVICIOS,
+)))
+def reservas(request):
+    try:
+        campos = elegir_campos(request, CAMPOS_RESERVA, extras=('detalles',))
+        resultados, ids, siguiente = paginar(
+            request, Reserva.objects.filter(usuario=request.user), campos, CAMPOS_RESERVA, descendente=True
+        )
+    except ValueError as e:
+        return error(str(e), 400)
+
+    if 'detalles' in campos:
+        # Una sola consulta para los detalles de toda la página
+        detalles = {reserva_id: [] for reserva_id in ids}
+        for d in DetalleReserva.objects.filter(reserva_id__in=ids).order_by('id').values(
+            'reserva_id', 'servicio_id', 'servicio__nombre', 'cantidad', 'precio_unitario',
+        ):
+            detalles[d['reserva_id']].append({
+                'servicio_id': d['servicio_id'],
+                'servicio': d['servicio__nombre'],
+                'cantidad': d['cantidad'],
+                'precio_unitario': d['precio_unitario'],
+            })
+        for reserva_id, resultado in zip(ids, resultados):
+            resultado['detalles'] = detalles[reserva_id]
+    return JsonResponse({'resultados': resultados, 'siguiente': siguiente})
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registra las tareas de la cola en segundo plano (ver core/cola.py)
+        # y conecta las señales de cachés (estados, tarifas), versiones de la API, contadores,
+        # recomendaciones y actividad de carritos
+        from . import contadores, estados, precios, recomendaciones, retencion, tareas, versiones  # noqa: F401
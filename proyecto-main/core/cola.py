@@ -0,0 +1,194 @@
+# core/cola.py
+
+import logging
+import random
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Registro en memoria de las funciones que pueden ejecutarse como tareas
+_REGISTRO = {}
+# Tareas que se vuelven a encolar solas: nombre -> intervalo entre ejecuciones
+_PERIODICAS = {}
+
+RETRASO_BASE = 10 # Segundos de espera antes del primer reintento
+RETRASO_MAXIMO = 60 * 60 # Nunca esperar más de una hora entre reintentos
+TIEMPO_BLOQUEO = timedelta(minutes=15) # Tareas 'en_proceso' más antiguas se consideran abandonadas
+
+
+def tarea(nombre=None, max_intentos=5, cada=None):
+    """
+    Decorador que registra una función como tarea de la cola.
+    La función decorada gana un atributo `encolar(**argumentos)`.
+    Con `cada` (un timedelta) la tarea es periódica: al terminar se programa la siguiente
+    ejecución y `programar_periodicas()` la encola si no hay ninguna en la cola.
+    """
+    def decorador(func):
+        nombre_tarea = nombre or f"{func.__module__}.{func.__name__}"
+        _REGISTRO[nombre_tarea] = func
+        if cada is not None:
+            _PERIODICAS[nombre_tarea] = cada
+        func.nombre_tarea = nombre_tarea
+        func.encolar = lambda ejecutar_en=None, **argumentos: encolar(
+            nombre_tarea, argumentos, ejecutar_en=ejecutar_en, max_intentos=max_intentos
+        )
+        return func
+    return decorador
+
+
+def encolar(nombre, argumentos=None, ejecutar_en=None, max_intentos=5):
+    """
+    Inserta una tarea en la cola.
+    La fila se crea dentro de la transacción actual, así que los workers solo la ven
+    después del commit y desaparece si la transacción hace rollback.
+    """
+    if nombre not in _REGISTRO:
+        raise ValueError(f"La tarea '{nombre}' no está registrada.")
+    return Tarea.objects.create(
+        nombre=nombre,
+        argumentos=argumentos or {},
+        max_intentos=max_intentos,
+        ejecutar_despues=ejecutar_en or timezone.now(),
+    )
+
+
+def encolar_muchos(nombre, lista_argumentos, max_intentos=5):
+    """
+    Inserta muchas tareas del mismo tipo con un solo INSERT (bulk_create).
+    """
+    if nombre not in _REGISTRO:
+        raise ValueError(f"La tarea '{nombre}' no está registrada.")
+    ahora = timezone.now()
+    return Tarea.objects.bulk_create([
+        Tarea(nombre=nombre, argumentos=argumentos, max_intentos=max_intentos, ejecutar_despues=ahora)
+        for argumentos in lista_argumentos
+    ], batch_size=500)
+
+
+def programar_periodicas():
+    """
+    Encola para ya cada tarea periódica que no tenga una ejecución pendiente o en proceso.
+    Los workers la llaman al iniciar, así que basta con levantar `procesar_tareas`.
+    """
+    en_cola = set(Tarea.objects.filter(
+        nombre__in=_PERIODICAS, estado__in=[Tarea.PENDIENTE, Tarea.EN_PROCESO],
+    ).values_list('nombre', flat=True))
+    faltantes = [nombre for nombre in _PERIODICAS if nombre not in en_cola]
+    for nombre in faltantes:
+        encolar(nombre)
+    return len(faltantes)
+
+
+def _reprogramar(tarea_obj):
+    # Siguiente ejecución de una tarea periódica, salvo que ya haya otra esperando
+    # (así dos workers que arrancan a la vez no dejan la tarea duplicada para siempre)
+    cada = _PERIODICAS.get(tarea_obj.nombre)
+    if cada is None:
+        return
+    if not Tarea.objects.filter(nombre=tarea_obj.nombre, estado=Tarea.PENDIENTE).exists():
+        encolar(tarea_obj.nombre, tarea_obj.argumentos, ejecutar_en=timezone.now() + cada,
+                max_intentos=tarea_obj.max_intentos)
+
+
+def calcular_retraso(intentos):
+    """
+    Backoff exponencial con un poco de aleatoriedad para no reintentar todo a la vez.
+    """
+    retraso = min(RETRASO_BASE * (2 ** max(intentos - 1, 0)), RETRASO_MAXIMO)
+    return timedelta(seconds=retraso + random.uniform(0, retraso * 0.1))
+
+
+def liberar_tareas_abandonadas():
+    """
+    Devuelve a 'pendiente' las tareas cuyo worker murió sin terminarlas.
+    """
+    limite = timezone.now() - TIEMPO_BLOQUEO
+    return Tarea.objects.filter(estado=Tarea.EN_PROCESO, bloqueada_en__lt=limite).update(
+        estado=Tarea.PENDIENTE, bloqueada_en=None
+    )
+
+
+def reclamar_tareas(limite=10):
+    """
+    Marca como 'en_proceso' hasta `limite` tareas listas y las devuelve.
+    Usa SELECT ... FOR UPDATE SKIP LOCKED si la base de datos lo soporta (PostgreSQL, MySQL 8);
+    en otro caso (SQLite) reclama cada fila con un UPDATE condicional sobre el estado.
+    """
+    ahora = timezone.now()
+    listas = Tarea.objects.filter(
+        estado=Tarea.PENDIENTE, ejecutar_despues__lte=ahora
+    ).order_by('ejecutar_despues', 'id')
+    reclamo = {'estado': Tarea.EN_PROCESO, 'bloqueada_en': ahora, 'intentos': F('intentos') + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(listas.select_for_update(skip_locked=True).values_list('id', flat=True)[:limite])
+            Tarea.objects.filter(id__in=ids).update(**reclamo)
+    else:
+        ids = []
+        for tarea_id in listas.values_list('id', flat=True)[:limite]:
+            # Si otro worker la tomó primero, el UPDATE no afecta ninguna fila
+            if Tarea.objects.filter(id=tarea_id, estado=Tarea.PENDIENTE).update(**reclamo):
+                ids.append(tarea_id)
+
+    return list(Tarea.objects.filter(id__in=ids).order_by('ejecutar_despues', 'id'))
+
+
+def ejecutar_tarea(tarea_obj):
+    """
+    Ejecuta una tarea ya reclamada y registra el resultado.
+    Si falla y le quedan intentos, se reprograma con backoff; si no, queda como 'fallida'.
+    El resultado solo se guarda si la tarea sigue reclamada por este worker: si tardó más que
+    TIEMPO_BLOQUEO y otro la volvió a tomar, esa otra ejecución es la que cuenta.
+    """
+    func = _REGISTRO.get(tarea_obj.nombre)
+    try:
+        if func is None:
+            raise LookupError(f"La tarea '{tarea_obj.nombre}' no está registrada.")
+        func(**tarea_obj.argumentos)
+    except Exception as e:
+        logger.exception("Falló la tarea %s (intento %s)", tarea_obj.id, tarea_obj.intentos)
+        if tarea_obj.intentos >= tarea_obj.max_intentos:
+            cambios = {'estado': Tarea.FALLIDA, 'fecha_fin': timezone.now()}
+        else:
+            cambios = {
+                'estado': Tarea.PENDIENTE,
+                'ejecutar_despues': timezone.now() + calcular_retraso(tarea_obj.intentos),
+            }
+        _terminar(tarea_obj, ultimo_error=repr(e), **cambios)
+        return False
+
+    return _terminar(tarea_obj, estado=Tarea.COMPLETADA, fecha_fin=timezone.now())
+
+
+def _terminar(tarea_obj, **cambios):
+    """
+    Guarda el resultado con un UPDATE condicional sobre el reclamo (estado y bloqueada_en).
+    Retorna False si otro worker reclamó la tarea entretanto y no se cambió nada.
+    """
+    with transaction.atomic():
+        guardada = Tarea.objects.filter(
+            id=tarea_obj.id, estado=Tarea.EN_PROCESO, bloqueada_en=tarea_obj.bloqueada_en,
+        ).update(bloqueada_en=None, **cambios)
+        if not guardada:
+            logger.warning("La tarea %s fue reclamada por otro worker; se descarta este resultado", tarea_obj.id)
+            return False
+        if cambios['estado'] != Tarea.PENDIENTE:
+            _reprogramar(tarea_obj)
+    return cambios['estado'] == Tarea.COMPLETADA
+
+
+def procesar_lote(limite=10):
+    """
+    Reclama y ejecuta un lote de tareas. Retorna cuántas se procesaron.
+    """
+    tareas = reclamar_tareas(limite)
+    for tarea_obj in tareas:
+        ejecutar_tarea(tarea_obj)
+    return len(tareas)
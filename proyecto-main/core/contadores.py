@@ -0,0 +1,89 @@
+# core/contadores.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import DetalleReserva, Reserva, Servicio, Usuario
+
+# Mientras está activo, borrar reservas/detalles no descuenta (se usa al archivar: se mueven, no se anulan)
+_suspendido = ContextVar('contadores_suspendidos', default=False)
+
+
+@contextmanager
+def suspender():
+    token = _suspendido.set(True)
+    try:
+        yield
+    finally:
+        _suspendido.reset(token)
+
+
+def importe(cantidad, precio_unitario):
+    return cantidad * precio_unitario
+
+
+def _ajustar_detalle(servicio_id, reserva_id, cantidad, precio_unitario, signo):
+    """
+    Suma (signo=1) o resta (signo=-1) una línea de detalle a los contadores de su servicio y su reserva.
+    Todo con UPDATE ... SET campo = campo + delta, sin leer los valores actuales.
+    Los conteos nunca bajan de 0, por si el contador ya venía desfasado (lo corrige verificar_contadores).
+    """
+    monto = importe(cantidad, precio_unitario) * signo
+    Servicio.objects.filter(id=servicio_id).update(
+        veces_reservado=Greatest(F('veces_reservado') + signo, 0),
+        ingresos=F('ingresos') + monto,
+    )
+    Reserva.objects.filter(id=reserva_id).update(
+        cantidad_items=Greatest(F('cantidad_items') + signo, 0),
+        total_calculado=F('total_calculado') + monto,
+    )
+
+
+def _detalle_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    # Guarda los valores anteriores para poder descontarlos si la línea cambia
+    instance._contador_previo = None
+    if raw or instance.pk is None:
+        return
+    instance._contador_previo = DetalleReserva.objects.filter(pk=instance.pk).values(
+        'servicio_id', 'reserva_id', 'cantidad', 'precio_unitario'
+    ).first()
+
+
+def _detalle_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previo = getattr(instance, '_contador_previo', None)
+    actual = (instance.servicio_id, instance.reserva_id, instance.cantidad, instance.precio_unitario)
+    if previo is not None:
+        anterior = (previo['servicio_id'], previo['reserva_id'], previo['cantidad'], previo['precio_unitario'])
+        if anterior == actual:
+            return
+        _ajustar_detalle(*anterior, signo=-1)
+    _ajustar_detalle(*actual, signo=1)
+
+
+def _detalle_borrado(sender, instance, **kwargs):
+    if _suspendido.get():
+        return
+    _ajustar_detalle(instance.servicio_id, instance.reserva_id, instance.cantidad, instance.precio_unitario, signo=-1)
+
+
+def _reserva_guardada(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Usuario.objects.filter(id=instance.usuario_id).update(cantidad_reservas=F('cantidad_reservas') + 1)
+
+
+def _reserva_borrada(sender, instance, **kwargs):
+    if not _suspendido.get():
+        Usuario.objects.filter(id=instance.usuario_id).update(cantidad_reservas=Greatest(F('cantidad_reservas') - 1, 0))
+
+
+pre_save.connect(_detalle_antes_de_guardar, sender=DetalleReserva, dispatch_uid='contadores_detalle_pre_save')
+post_save.connect(_detalle_guardado, sender=DetalleReserva, dispatch_uid='contadores_detalle_save')
+post_delete.connect(_detalle_borrado, sender=DetalleReserva, dispatch_uid='contadores_detalle_delete')
+post_save.connect(_reserva_guardada, sender=Reserva, dispatch_uid='contadores_reserva_save')
+post_delete.connect(_reserva_borrada, sender=Reserva, dispatch_uid='contadores_reserva_delete')
@@ -0,0 +1,171 @@
+# core/estados.py
+
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import versiones
+from .models import EstadoPago, EstadoReserva, MetodoPago, Pago, Reserva
+
+# --- Estados conocidos (coinciden con los textos usados en las plantillas) ---
+
+RESERVA_PENDIENTE = 'Pendiente'
+RESERVA_CONFIRMADA = 'Confirmado'
+RESERVA_CANCELADA = 'Cancelado'
+RESERVA_COMPLETADA = 'Completado'
+
+PAGO_PENDIENTE = 'Pendiente'
+PAGO_APROBADO = 'Aprobado'
+PAGO_RECHAZADO = 'Rechazado'
+PAGO_REEMBOLSADO = 'Reembolsado'
+
+# Transiciones permitidas: estado actual -> estados a los que puede pasar
+TRANSICIONES_RESERVA = {
+    RESERVA_PENDIENTE: {RESERVA_CONFIRMADA, RESERVA_CANCELADA},
+    RESERVA_CONFIRMADA: {RESERVA_COMPLETADA, RESERVA_CANCELADA},
+    RESERVA_CANCELADA: set(),
+    RESERVA_COMPLETADA: set(),
+}
+
+TRANSICIONES_PAGO = {
+    PAGO_PENDIENTE: {PAGO_APROBADO, PAGO_RECHAZADO},
+    PAGO_APROBADO: {PAGO_REEMBOLSADO},
+    PAGO_RECHAZADO: set(),
+    PAGO_REEMBOLSADO: set(),
+}
+
+
+class TransicionInvalida(Exception):
+    """
+    El cambio de estado pedido no está permitido desde el estado actual.
+    """
+
+
+class ConflictoDeEstado(TransicionInvalida):
+    """
+    Otro proceso cambió el estado entre la lectura y la actualización.
+    """
+
+
+# --- Caché en memoria de las tablas de consulta ---
+
+_cache = {}
+_candado = threading.Lock()
+
+
+def _recordar(clave, obj_id):
+    """
+    Guarda el id en la caché solo cuando la transacción actual confirma (de inmediato si no hay una).
+    Así, si la fila se creó dentro de una transacción que luego hace rollback, la caché no queda
+    apuntando a un id inexistente.
+    """
+    transaction.on_commit(lambda: _cache.setdefault(clave, obj_id))
+
+
+def _obtener_id(modelo, campo, valor, crear=True):
+    """
+    Retorna el id de la fila `modelo` con `campo=valor`, creándola si no existe
+    (los estados conocidos ya vienen creados por la migración 0009).
+    Con crear=False retorna None en vez de insertarla.
+    Solo consulta la base de datos la primera vez por proceso.
+    """
+    clave = (modelo, valor)
+    try:
+        return _cache[clave]
+    except KeyError:
+        pass
+    with _candado:
+        if clave in _cache:
+            return _cache[clave]
+        obj = modelo.objects.filter(**{campo: valor}).order_by('id').first()
+        if obj is None:
+            if not crear:
+                return None
+            obj = modelo.objects.create(**{campo: valor})
+        _recordar(clave, obj.id)
+        return obj.id
+
+
+def _nombre_por_id(modelo, campo, obj_id):
+    """
+    Búsqueda inversa (id -> nombre) usando la misma caché.
+    """
+    if obj_id is None:
+        return None
+    for (cache_modelo, valor), cache_id in list(_cache.items()):
+        if cache_modelo is modelo and cache_id == obj_id:
+            return valor
+    valor = modelo.objects.filter(id=obj_id).values_list(campo, flat=True).first()
+    if valor is not None:
+        _recordar((modelo, valor), obj_id)
+    return valor
+
+
+def limpiar_cache(**kwargs):
+    _cache.clear()
+
+
+# Si alguien edita las tablas de consulta (por ejemplo en el admin), se invalida la caché
+for _modelo in (EstadoReserva, EstadoPago, MetodoPago):
+    post_save.connect(limpiar_cache, sender=_modelo, dispatch_uid=f'cache_estados_save_{_modelo.__name__}')
+    post_delete.connect(limpiar_cache, sender=_modelo, dispatch_uid=f'cache_estados_delete_{_modelo.__name__}')
+
+
+def estado_reserva_id(nombre, crear=True):
+    return _obtener_id(EstadoReserva, 'estado', nombre, crear)
+
+
+def estado_pago_id(nombre, crear=True):
+    return _obtener_id(EstadoPago, 'estado', nombre, crear)
+
+
+def metodo_pago_id(nombre):
+    return _obtener_id(MetodoPago, 'nombre', nombre)
+
+
+# --- Transiciones ---
+
+def _transicionar(modelo, campo, obtener_id, modelo_estado, transiciones, pendiente, obj_id, nuevo):
+    """
+    Aplica una transición con concurrencia optimista:
+    UPDATE ... SET campo=nuevo WHERE id=obj_id AND campo=actual.
+    Las filas sin estado se tratan como pendientes.
+    """
+    if nuevo not in transiciones:
+        raise TransicionInvalida(f"Estado desconocido: '{nuevo}'.")
+    actual_id = modelo.objects.filter(id=obj_id).values_list(f'{campo}_id', flat=True).get()
+    actual = _nombre_por_id(modelo_estado, 'estado', actual_id) or pendiente
+    if nuevo not in transiciones.get(actual, set()):
+        raise TransicionInvalida(f"No se puede pasar de '{actual}' a '{nuevo}'.")
+
+    filtro = {'id': obj_id, f'{campo}_id': actual_id} if actual_id else {'id': obj_id, f'{campo}__isnull': True}
+    if not modelo.objects.filter(**filtro).update(**{f'{campo}_id': obtener_id(nuevo)}):
+        raise ConflictoDeEstado(f"{modelo.__name__} {obj_id} cambió de estado mientras se actualizaba.")
+    return actual
+
+
+def transicionar_reserva(reserva_id, nuevo):
+    """
+    Cambia el estado de una reserva respetando TRANSICIONES_RESERVA. Retorna el estado anterior.
+    """
+    anterior = _transicionar(Reserva, 'estado', estado_reserva_id, EstadoReserva,
+                             TRANSICIONES_RESERVA, RESERVA_PENDIENTE, reserva_id, nuevo)
+    usuario_id = Reserva.objects.filter(id=reserva_id).values_list('usuario_id', flat=True).get()
+    versiones.incrementar(versiones.clave_reservas(usuario_id))
+    return anterior
+
+
+def transicionar_pago(pago_id, nuevo):
+    """
+    Cambia el estado de un pago respetando TRANSICIONES_PAGO. Retorna el estado anterior.
+    """
+    return _transicionar(Pago, 'estado_pago', estado_pago_id, EstadoPago,
+                         TRANSICIONES_PAGO, PAGO_PENDIENTE, pago_id, nuevo)
+
+
+def origenes(transiciones, nuevo):
+    """
+    Estados desde los que se puede llegar a `nuevo` (para actualizaciones masivas).
+    """
+    return [estado for estado, destinos in transiciones.items() if nuevo in destinos]
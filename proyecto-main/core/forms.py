@@ -104,4 +104,18 @@ class PerfilUsuarioForm(ModelForm):
             'nombre': forms.TextInput(attrs={'class': 'form-control'}),
             'apellido': forms.TextInput(attrs={'class': 'form-control'}),
             'telefono': forms.TextInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+# Formulario para la importación masiva de servicios (ver core/importacion.py)
+class ImportarServiciosForm(forms.Form):
+    archivo = forms.FileField(label='Archivo CSV',
+                              widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}))
+
+    def clean_archivo(self):
+        """
+        Valida que el archivo tenga extensión .csv.
+        """
+        archivo = self.cleaned_data.get('archivo')
+        if archivo and not archivo.name.lower().endswith('.csv'):
+            raise ValidationError("El archivo debe ser un CSV.")
+        return archivo
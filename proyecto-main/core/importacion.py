@@ -0,0 +1,246 @@
+# core/importacion.py
+
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.utils import validate_file_name
+from django.db import DatabaseError, transaction
+from django.utils._os import safe_join
+
+from . import precios, versiones
+from .miniaturas import Image, crear_miniatura
+from .models import Servicio, TipoServicio
+
+COLUMNAS = {'nombre', 'descripcion', 'precio', 'tipo_servicio'} # Obligatorias
+LOTE = 1000 # Filas validadas e insertadas por consulta
+TAMANO_MINIATURA = (400, 300)
+VERDADEROS = {'1', 'si', 'sí', 'true', 'verdadero', 'x'}
+FALSOS = {'0', 'no', 'false', 'falso'}
+CAMPOS_ACTUALIZABLES = ['descripcion', 'precio', 'tipo_servicio']
+OPCIONALES = ['cobro_por_noche', 'recargo_fin_de_semana', 'imagen'] # Solo se sobrescriben si el archivo trae la columna
+
+
+class ArchivoInvalido(ValueError):
+    """
+    No se pudo leer el encabezado del archivo: no se importó nada.
+    """
+
+
+class ColumnasFaltantes(ArchivoInvalido):
+    """
+    El archivo no trae alguna de las columnas obligatorias.
+    """
+
+
+class ResultadoImportacion:
+    """
+    Resumen de una importación. `errores` es una lista de (número de fila, mensaje);
+    las filas con error se omiten sin detener el resto del archivo.
+    """
+
+    def __init__(self):
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = []
+        self.avisos = []
+        self.con_imagen = {} # servicio_id -> número de fila, para las miniaturas pendientes
+
+    @property
+    def procesados(self):
+        return self.creados + self.actualizados
+
+
+def _booleano(valor, defecto):
+    valor = (valor or '').strip().lower()
+    if not valor:
+        return defecto
+    if valor in VERDADEROS:
+        return True
+    if valor in FALSOS:
+        return False
+    raise ValidationError(f"'{valor}' no es un valor sí/no válido.")
+
+
+def _decimal(campo, valor):
+    """
+    Convierte y valida con el mismo campo del modelo (dígitos, decimales y mínimo permitidos,
+    así un precio o recargo negativo queda como error de la fila).
+    """
+    try:
+        return Servicio._meta.get_field(campo).clean((valor or '').strip().replace(',', '.'), None)
+    except ValidationError as e:
+        raise ValidationError(f"{campo}: {' '.join(e.messages)}")
+
+
+def _imagen(valor):
+    """
+    Ruta relativa a MEDIA_ROOT: sin rutas absolutas ni '..', y que quepa en el campo.
+    """
+    imagen = (valor or '').strip()
+    if not imagen:
+        return ''
+    try:
+        validate_file_name(imagen, allow_relative_path=True)
+    except SuspiciousFileOperation:
+        raise ValidationError(f"La imagen '{imagen}' debe ser una ruta relativa dentro de la carpeta de medios.")
+    if len(imagen) > Servicio._meta.get_field('imagen').max_length:
+        raise ValidationError('La ruta de la imagen es demasiado larga.')
+    return imagen
+
+
+def _validar(fila, anfitrion, tipos):
+    """
+    Construye un Servicio (sin guardar) a partir de una fila del CSV o lanza ValidationError.
+    """
+    nombre = (fila.get('nombre') or '').strip()
+    if not nombre:
+        raise ValidationError('El nombre es obligatorio.')
+    if len(nombre) > Servicio._meta.get_field('nombre').max_length:
+        raise ValidationError('El nombre es demasiado largo.')
+    tipo = (fila.get('tipo_servicio') or '').strip()
+    tipo_id = tipos.get(tipo.lower())
+    if tipo_id is None:
+        raise ValidationError(f"No existe el tipo de servicio '{tipo}'.")
+    precio = _decimal('precio', fila.get('precio'))
+    recargo = fila.get('recargo_fin_de_semana')
+    return Servicio(
+        nombre=nombre,
+        descripcion=(fila.get('descripcion') or '').strip(),
+        precio=precio,
+        tipo_servicio_id=tipo_id,
+        anfitrion=anfitrion,
+        cobro_por_noche=_booleano(fila.get('cobro_por_noche'), True),
+        recargo_fin_de_semana=_decimal('recargo_fin_de_semana', recargo) if (recargo or '').strip() else 0,
+        imagen=_imagen(fila.get('imagen')),
+    )
+
+
+def _guardar_lote(lote, anfitrion, tipos, resultado, actualizables=CAMPOS_ACTUALIZABLES):
+    """
+    Valida un lote de filas (numero, fila) y hace un solo upsert por (anfitrion, nombre).
+    En los servicios que ya existían solo se sobrescriben los campos de `actualizables`.
+    """
+    servicios = {} # nombre -> Servicio; si el nombre se repite en el lote, gana la última fila
+    filas = {}
+    for numero, fila in lote:
+        try:
+            servicio = _validar(fila, anfitrion, tipos)
+        except ValidationError as e:
+            resultado.errores.append((numero, ' '.join(e.messages)))
+            continue
+        servicios[servicio.nombre] = servicio
+        filas[servicio.nombre] = numero
+    if not servicios:
+        return
+
+    try:
+        with transaction.atomic():
+            existentes = set(Servicio.objects.filter(anfitrion=anfitrion, nombre__in=servicios).values_list('nombre', flat=True))
+            Servicio.objects.bulk_create(
+                servicios.values(), update_conflicts=True,
+                unique_fields=['anfitrion', 'nombre'], update_fields=actualizables,
+            )
+    except DatabaseError as e:
+        # Un error de la base de datos invalida el lote completo, pero no detiene el archivo
+        resultado.errores.extend((numero, f'No se pudo guardar el lote: {e}') for numero in filas.values())
+        return
+
+    resultado.actualizados += len(existentes)
+    resultado.creados += len(servicios) - len(existentes)
+    con_imagen = [nombre for nombre, servicio in servicios.items() if servicio.imagen]
+    if con_imagen:
+        for servicio_id, nombre in Servicio.objects.filter(anfitrion=anfitrion, nombre__in=con_imagen).values_list('id', 'nombre'):
+            resultado.con_imagen[servicio_id] = filas[nombre]
+
+
+def importar_servicios(archivo, anfitrion, lote=LOTE, miniaturas=True, procesos=None):
+    """
+    Importa servicios de `anfitrion` desde un archivo CSV de texto ya abierto.
+    Columnas: nombre, descripcion, precio, tipo_servicio (por nombre) y, opcionales,
+    cobro_por_noche, recargo_fin_de_semana e imagen (ruta relativa a MEDIA_ROOT). Una columna opcional
+    ausente no modifica ese campo en los servicios que ya existían.
+    El archivo se lee en lotes de `lote` filas, así que el tamaño no afecta la memoria usada.
+    Si el archivo no se puede leer a mitad de camino (codificación o CSV mal formado), lo leído
+    hasta ahí queda guardado y el problema se informa como error de la fila.
+    Si `miniaturas` es False, los ids con imagen quedan en `resultado.con_imagen` para procesarlos aparte.
+    """
+    filas = csv.DictReader(archivo)
+    try:
+        columnas = set(filas.fieldnames or [])
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ArchivoInvalido(f'No se pudo leer el encabezado del archivo: {e}')
+    faltantes = COLUMNAS - columnas
+    if faltantes:
+        raise ColumnasFaltantes(f"Faltan columnas en el archivo: {', '.join(sorted(faltantes))}")
+    actualizables = CAMPOS_ACTUALIZABLES + [campo for campo in OPCIONALES if campo in columnas]
+
+    tipos = {nombre.lower(): tipo_id for tipo_id, nombre in TipoServicio.objects.values_list('id', 'nombre')}
+    resultado = ResultadoImportacion()
+    bloque, numero = [], 1 # La fila 1 es el encabezado
+    try:
+        for numero, fila in enumerate(filas, start=2):
+            bloque.append((numero, fila))
+            if len(bloque) == lote:
+                _guardar_lote(bloque, anfitrion, tipos, resultado, actualizables)
+                bloque = []
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Los lotes anteriores ya se guardaron: se informa la fila y se guarda lo leído hasta ahí
+        resultado.errores.append((numero + 1, f'No se pudo leer el archivo desde esta fila: {e}'))
+        resultado.avisos.append(f'El archivo se leyó solo hasta la fila {numero}.')
+    if bloque:
+        _guardar_lote(bloque, anfitrion, tipos, resultado, actualizables)
+
+    if resultado.procesados:
+        # bulk_create no emite señales: se invalidan a mano el catálogo versionado y los precios en caché
+        versiones.incrementar(versiones.SERVICIOS)
+        precios.limpiar_cache()
+    if miniaturas and resultado.con_imagen:
+        errores = generar_miniaturas(list(resultado.con_imagen), procesos=procesos)
+        resultado.errores.extend((resultado.con_imagen[servicio_id], mensaje) for servicio_id, mensaje in errores.items())
+        resultado.errores.sort(key=lambda error: error[0])
+        if Image is None:
+            resultado.avisos.append('Pillow no está instalado: no se generaron miniaturas.')
+    return resultado
+
+
+# --- Miniaturas ---
+
+def generar_miniaturas(servicio_ids, procesos=None, tamano=TAMANO_MINIATURA):
+    """
+    Genera en paralelo (un pool de procesos, el trabajo es de CPU) la miniatura JPEG de cada servicio
+    con imagen y guarda su ruta con un solo bulk_update. Retorna {servicio_id: mensaje de error}.
+    """
+    if Image is None:
+        return {}
+    servicios = list(Servicio.objects.filter(id__in=servicio_ids).exclude(imagen='').values_list('id', 'imagen'))
+    if not servicios:
+        return {}
+    carpeta = os.path.join(settings.MEDIA_ROOT, Servicio._meta.get_field('miniatura').upload_to)
+    os.makedirs(carpeta, exist_ok=True)
+    errores, listos, origenes = {}, [], {}
+    for servicio_id, imagen in servicios:
+        # Las rutas que no pasaron por _validar (p. ej. editadas a mano) no pueden salir de MEDIA_ROOT
+        try:
+            origenes[servicio_id] = safe_join(settings.MEDIA_ROOT, imagen)
+        except SuspiciousFileOperation:
+            errores[servicio_id] = f"La imagen '{imagen}' está fuera de la carpeta de medios."
+    servicios = [(servicio_id, imagen) for servicio_id, imagen in servicios if servicio_id in origenes]
+    nombres = [f'{servicio_id}.jpg' for servicio_id, _ in servicios]
+    destinos = [os.path.join(carpeta, nombre) for nombre in nombres]
+
+    # spawn: los hijos no heredan por fork las conexiones a la base de datos ni los hilos del servidor;
+    # solo importan core/miniaturas.py, que no depende de Django
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn')) as pool:
+        resultados = pool.map(crear_miniatura, origenes.values(), destinos, repeat(tamano), chunksize=16)
+        for (servicio_id, imagen), nombre, error in zip(servicios, nombres, resultados):
+            if error:
+                errores[servicio_id] = f"No se pudo procesar la imagen '{imagen}': {error}"
+            else:
+                listos.append(Servicio(id=servicio_id, miniatura=Servicio._meta.get_field('miniatura').upload_to + nombre))
+    Servicio.objects.bulk_update(listos, ['miniatura'], batch_size=500)
+    return errores
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core import retencion
+
+
+class Command(BaseCommand):
+    help = (
+        'Desactiva carritos abandonados, borra carritos inactivos antiguos y archiva reservas viejas, '
+        'en lotes pequeños ordenados por id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-carrito', type=int, default=retencion.DIAS_CARRITO_ABANDONADO,
+                            help='Días sin actividad para considerar abandonado un carrito.')
+        parser.add_argument('--dias-purga', type=int, default=retencion.DIAS_PURGA_CARRITO,
+                            help='Días sin actividad para borrar un carrito inactivo.')
+        parser.add_argument('--dias-reserva', type=int, default=retencion.DIAS_ARCHIVO_RESERVA,
+                            help='Días desde el término de la reserva para archivarla.')
+        parser.add_argument('--lote', type=int, default=retencion.LOTE, help='Filas por transacción.')
+        parser.add_argument('--pausa', type=float, default=retencion.PAUSA, help='Segundos de espera entre lotes.')
+        parser.add_argument('--solo', choices=['carritos', 'reservas'], help='Aplica solo una parte de la política.')
+
+    def handle(self, *args, **options):
+        lotes = {'lote': options['lote'], 'pausa': options['pausa']}
+        if options['solo'] != 'reservas':
+            abandonados = retencion.abandonar_carritos(dias=options['dias_carrito'], **lotes)
+            purgados = retencion.purgar_carritos(dias=options['dias_purga'], **lotes)
+            self.stdout.write(f'Carritos desactivados: {abandonados}. Carritos borrados: {purgados}.')
+        if options['solo'] != 'carritos':
+            archivadas = retencion.archivar_reservas(dias=options['dias_reserva'], **lotes)
+            self.stdout.write(f'Reservas archivadas: {archivadas}.')
+        self.stdout.write(self.style.SUCCESS('Retención aplicada.'))
@@ -0,0 +1,136 @@
+import csv
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from core.cola import encolar_muchos
+from core.estados import (
+    PAGO_APROBADO, PAGO_PENDIENTE, PAGO_RECHAZADO, RESERVA_CANCELADA, RESERVA_CONFIRMADA,
+    RESERVA_PENDIENTE, TRANSICIONES_PAGO, estado_pago_id, estado_reserva_id, origenes,
+)
+from core import versiones
+from core.models import Pago, Reserva
+from core.versiones import clave_reservas
+
+# Estados tal como los informa el proveedor -> estado interno del pago
+ESTADOS_PROVEEDOR = {
+    'aprobado': PAGO_APROBADO,
+    'approved': PAGO_APROBADO,
+    'rechazado': PAGO_RECHAZADO,
+    'rejected': PAGO_RECHAZADO,
+}
+
+# Estado en que queda la reserva cuando el pago llega a cada estado
+RESERVA_SEGUN_PAGO = {
+    PAGO_APROBADO: RESERVA_CONFIRMADA,
+    PAGO_RECHAZADO: RESERVA_CANCELADA,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Concilia un archivo CSV del proveedor de pagos (columnas: pago_id, monto, estado) '
+        'contra core.Pago usando consultas por lote.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta al CSV del proveedor (o a un fixture local).')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas procesadas por consulta.')
+        parser.add_argument('--simular', action='store_true', help='Reporta sin modificar la base de datos.')
+
+    def handle(self, *args, **options):
+        self.resumen = Counter()
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8') as f:
+                filas = csv.DictReader(f)
+                faltantes = {'pago_id', 'monto', 'estado'} - set(filas.fieldnames or [])
+                if faltantes:
+                    raise CommandError(f"Faltan columnas en el archivo: {', '.join(sorted(faltantes))}")
+                while True:
+                    lote = list(islice(filas, options['lote']))
+                    if not lote:
+                        break
+                    self.conciliar_lote(lote, options['simular'])
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        for clave, cantidad in sorted(self.resumen.items()):
+            self.stdout.write(f'{clave}: {cantidad}')
+        self.stdout.write(self.style.SUCCESS('Conciliación terminada.'))
+
+    def conciliar_lote(self, lote, simular):
+        """
+        Concilia un lote con una consulta de lectura y un UPDATE por cada estado destino.
+        """
+        reportados = {}
+        for fila in lote:
+            try:
+                pago_id = int(fila['pago_id'])
+                monto = Decimal(fila['monto'])
+            except (TypeError, ValueError, InvalidOperation):
+                self.resumen['filas_invalidas'] += 1
+                continue
+            estado = ESTADOS_PROVEEDOR.get((fila['estado'] or '').strip().lower())
+            if estado is None:
+                self.resumen['estado_desconocido'] += 1
+                continue
+            reportados[pago_id] = (monto, estado)
+
+        pagos = {
+            p['id']: p for p in Pago.objects.filter(id__in=reportados).values('id', 'monto', 'estado_pago_id')
+        }
+
+        por_estado = {estado: [] for estado in RESERVA_SEGUN_PAGO}
+        for pago_id, (monto, estado) in reportados.items():
+            pago = pagos.get(pago_id)
+            if pago is None:
+                self.resumen['no_encontrados'] += 1
+            elif pago['monto'] != monto:
+                self.resumen['monto_distinto'] += 1
+            elif pago['estado_pago_id'] is not None and pago['estado_pago_id'] == estado_pago_id(estado, crear=not simular):
+                self.resumen['ya_conciliados'] += 1
+            else:
+                por_estado[estado].append(pago_id)
+
+        for estado, ids in por_estado.items():
+            if ids:
+                self.aplicar(estado, ids, simular)
+
+    def aplicar(self, estado, ids, simular):
+        """
+        Mueve los pagos `ids` a `estado` con un UPDATE condicional sobre los estados de origen
+        permitidos; los que ya cambiaron a otro estado quedan como transición inválida.
+        """
+        estados_origen = origenes(TRANSICIONES_PAGO, estado)
+        # En modo simulación no se crean filas de estado que falten
+        condicion = Q(estado_pago_id__in=[estado_pago_id(e, crear=not simular) for e in estados_origen])
+        if PAGO_PENDIENTE in estados_origen:
+            condicion |= Q(estado_pago__isnull=True) # Pagos sin estado se consideran pendientes
+        candidatos = Pago.objects.filter(condicion, id__in=ids)
+
+        if simular:
+            actualizados = candidatos.count()
+        else:
+            with transaction.atomic():
+                # FOR UPDATE bloquea las filas para que nadie cambie su estado antes del UPDATE
+                movidos = dict(candidatos.select_for_update().values_list('id', 'reserva_id'))
+                actualizados = Pago.objects.filter(id__in=movidos).update(estado_pago_id=estado_pago_id(estado))
+                reservas = list(movidos.values())
+                # Solo cambian (y reciben correo) las reservas que siguen pendientes; se bloquean
+                # y se actualiza exactamente ese conjunto, así una reserva ya cancelada no se "confirma"
+                cambiadas = list(Reserva.objects.filter(
+                    Q(estado_id=estado_reserva_id(RESERVA_PENDIENTE)) | Q(estado__isnull=True),
+                    id__in=reservas,
+                ).select_for_update().values_list('id', flat=True))
+                Reserva.objects.filter(id__in=cambiadas).update(estado_id=estado_reserva_id(RESERVA_SEGUN_PAGO[estado]))
+                usuarios = Reserva.objects.filter(id__in=reservas).values_list('usuario_id', flat=True).distinct()
+                versiones.incrementar(*(clave_reservas(u) for u in usuarios))
+                if estado == PAGO_APROBADO:
+                    encolar_muchos('enviar_correo_confirmacion', [{'reserva_id': r} for r in cambiadas])
+
+        self.resumen[f'actualizados_{estado.lower()}'] += actualizados
+        self.resumen['transicion_invalida'] += len(ids) - actualizados
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importacion
+from core.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa (o actualiza) servicios de un anfitrión desde un CSV con columnas nombre, descripcion, '
+        'precio y tipo_servicio, leyéndolo por lotes. Las filas inválidas se reportan y se omiten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta al CSV (UTF-8).')
+        parser.add_argument('--anfitrion', required=True, help='Correo del anfitrión dueño de los servicios.')
+        parser.add_argument('--lote', type=int, default=importacion.LOTE, help='Filas por consulta.')
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Procesos para generar miniaturas (por defecto, uno por CPU).')
+        parser.add_argument('--sin-miniaturas', action='store_true', help='No genera miniaturas de las imágenes.')
+
+    def handle(self, *args, **options):
+        anfitrion = Usuario.objects.filter(correo=options['anfitrion']).first()
+        if anfitrion is None:
+            raise CommandError(f"No existe un usuario con correo {options['anfitrion']}.")
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as f:
+                resultado = importacion.importar_servicios(
+                    f, anfitrion, lote=options['lote'],
+                    miniaturas=not options['sin_miniaturas'], procesos=options['procesos'],
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+        except importacion.ArchivoInvalido as e:
+            raise CommandError(str(e))
+
+        for numero, mensaje in resultado.errores:
+            self.stderr.write(f'Fila {numero}: {mensaje}')
+        for aviso in resultado.avisos:
+            self.stdout.write(self.style.WARNING(aviso))
+        self.stdout.write(self.style.SUCCESS(
+            f'Servicios creados: {resultado.creados}. Actualizados: {resultado.actualizados}. '
+            f'Filas con error: {len(resultado.errores)}.'
+        ))
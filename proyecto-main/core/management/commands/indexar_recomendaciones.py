@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core import recomendaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Actualiza la matriz de co-ocurrencia "quienes reservaron esto también reservaron" '
+        'con los detalles nuevos, o la reconstruye completa con --completo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true',
+                            help='Recalcula desde cero (incluye reservas archivadas y descuenta las borradas).')
+        parser.add_argument('--lote', type=int, default=recomendaciones.LOTE, help='Detalles leídos por consulta.')
+        parser.add_argument('--top', type=int, default=recomendaciones.TOP_K, help='Sugerencias guardadas por servicio.')
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            pares = recomendaciones.reconstruir(lote=options['lote'], k=options['top'])
+            self.stdout.write(self.style.SUCCESS(f'Matriz reconstruida: {pares} pares de servicios.'))
+        else:
+            nuevos = recomendaciones.actualizar(lote=options['lote'], k=options['top'])
+            self.stdout.write(self.style.SUCCESS(f'Detalles nuevos indexados: {nuevos}.'))
@@ -0,0 +1,104 @@
+import logging
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.cola import liberar_tareas_abandonadas, procesar_lote, programar_periodicas
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_LIBERAR = 60 # Segundos entre revisiones de tareas abandonadas y periódicas sin programar
+ESPERA_MAXIMA_ERROR = 60 # Tope del backoff cuando un hilo encuentra errores seguidos
+ERRORES_UNA_VEZ = 3 # Con --una-vez, errores seguidos tras los que el hilo se rinde
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los workers de la cola de tareas en segundo plano (core.Tarea).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=4, help='Cantidad de hilos worker.')
+        parser.add_argument('--lote', type=int, default=10, help='Tareas reclamadas por cada consulta.')
+        parser.add_argument('--espera', type=float, default=2.0,
+                            help='Segundos de espera cuando la cola está vacía.')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vacía la cola una vez y termina (útil para cron o pruebas).')
+
+    def handle(self, *args, **options):
+        self.detener = threading.Event()
+        if not options['una_vez']:
+            # Permite terminar limpiamente con Ctrl+C o SIGTERM
+            signal.signal(signal.SIGINT, lambda *a: self.detener.set())
+            signal.signal(signal.SIGTERM, lambda *a: self.detener.set())
+
+        self.liberar()
+
+        self.procesadas = 0
+        self.candado = threading.Lock()
+        hilos = [
+            threading.Thread(target=self.worker, args=(options,), name=f'worker-{i}')
+            for i in range(options['hilos'])
+        ]
+        for hilo in hilos:
+            hilo.start()
+        # El hilo principal espera a los workers y, mientras tanto, recupera periódicamente
+        # las tareas que otro proceso dejó 'en_proceso' al caerse y reencola las periódicas perdidas
+        proxima_revision = time.monotonic() + INTERVALO_LIBERAR
+        while True:
+            vivos = [hilo for hilo in hilos if hilo.is_alive()]
+            if not vivos:
+                break
+            vivos[0].join(timeout=1)
+            if time.monotonic() >= proxima_revision:
+                self.liberar()
+                proxima_revision = time.monotonic() + INTERVALO_LIBERAR
+        self.stdout.write(self.style.SUCCESS(f'Workers detenidos. Tareas procesadas: {self.procesadas}'))
+
+    def liberar(self):
+        try:
+            liberadas = liberar_tareas_abandonadas()
+            programadas = programar_periodicas()
+        except Exception:
+            logger.exception("No se pudieron liberar las tareas abandonadas ni programar las periódicas")
+            return
+        finally:
+            close_old_connections()
+        if liberadas:
+            self.stdout.write(f'Se liberaron {liberadas} tareas abandonadas.')
+        if programadas:
+            self.stdout.write(f'Se programaron {programadas} tareas periódicas.')
+
+    def worker(self, options):
+        """
+        Bucle de cada hilo: reclama lotes hasta que se pida detener
+        (o hasta que la cola quede vacía con --una-vez).
+        Un error de la base de datos (por ejemplo "database is locked") no mata el hilo:
+        se registra, se cierra la conexión y se reintenta con una espera creciente.
+        """
+        errores_seguidos = 0
+        try:
+            while not self.detener.is_set():
+                close_old_connections()
+                try:
+                    cantidad = procesar_lote(options['lote'])
+                except Exception:
+                    errores_seguidos += 1
+                    logger.exception("Error en %s al procesar un lote (error %s seguido)",
+                                     threading.current_thread().name, errores_seguidos)
+                    connection.close()
+                    if options['una_vez'] and errores_seguidos >= ERRORES_UNA_VEZ:
+                        break
+                    self.detener.wait(min(options['espera'] * 2 ** errores_seguidos, ESPERA_MAXIMA_ERROR))
+                    continue
+                errores_seguidos = 0
+                with self.candado:
+                    self.procesadas += cantidad
+                if cantidad == 0:
+                    if options['una_vez']:
+                        break
+                    self.detener.wait(options['espera'])
+        finally:
+            # Cada hilo tiene su propia conexión; se cierra al terminar
+            connection.close()
@@ -0,0 +1,134 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+
+from core.models import (
+    DetalleReserva, DetalleReservaArchivado, Reserva, ReservaArchivada, Servicio, Usuario,
+)
+
+IMPORTE = Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _agrupar(queryset, campo, ids, **agregados):
+    """
+    {id: {agregado: valor}} para las filas de `queryset` cuyo `campo` está en `ids` (una consulta).
+    """
+    return {
+        fila[campo]: fila
+        for fila in queryset.filter(**{f'{campo}__in': ids}).values(campo).annotate(**agregados)
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula por lotes los contadores desnormalizados de Servicio, Reserva y Usuario, '
+        'reporta las diferencias y, con --reparar, las corrige.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige los valores desfasados.')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas recalculadas por consulta.')
+
+    def handle(self, *args, **options):
+        self.reparar = options['reparar']
+        self.lote = options['lote']
+        self.desfases = Counter()
+
+        self.verificar(Servicio, ['veces_reservado', 'ingresos'], self.esperado_servicios)
+        self.verificar(Reserva, ['cantidad_items', 'total_calculado'], self.esperado_reservas)
+        self.verificar(Usuario, ['cantidad_reservas'], self.esperado_usuarios)
+        self.verificar_totales()
+
+        if not self.desfases:
+            self.stdout.write(self.style.SUCCESS('Todos los contadores están al día.'))
+            return
+        for clave, cantidad in sorted(self.desfases.items()):
+            self.stdout.write(f'{clave}: {cantidad} filas desfasadas')
+        if self.reparar:
+            self.stdout.write(self.style.SUCCESS('Contadores reparados (Reserva.total no se modifica).'))
+        else:
+            self.stdout.write(self.style.WARNING('Usa --reparar para corregirlos.'))
+
+    def verificar(self, modelo, campos, esperado):
+        """
+        Recorre `modelo` por lotes de ids (keyset), compara los campos guardados con los
+        recalculados y repara si corresponde.
+        """
+        ultimo = 0
+        while True:
+            filas = list(modelo.objects.filter(id__gt=ultimo).order_by('id').values('id', *campos)[:self.lote])
+            if not filas:
+                return
+            ultimo = filas[-1]['id']
+            desfasados = self.comparar(filas, campos, esperado([f['id'] for f in filas]))
+            for fila_id, cambios in desfasados.items():
+                for campo in cambios:
+                    self.desfases[f'{modelo.__name__}.{campo}'] += 1
+            if self.reparar and desfasados:
+                self.reparar_filas(modelo, campos, esperado, list(desfasados))
+
+    @staticmethod
+    def comparar(filas, campos, calculados):
+        """
+        {id: {campo: valor esperado}} de las filas cuyos campos no coinciden con los recalculados.
+        """
+        desfasados = {}
+        for fila in filas:
+            valores = calculados.get(fila['id'], {})
+            cambios = {c: valores.get(c, 0) for c in campos if fila[c] != valores.get(c, 0)}
+            if cambios:
+                desfasados[fila['id']] = cambios
+        return desfasados
+
+    def reparar_filas(self, modelo, campos, esperado, ids):
+        """
+        Bloquea las filas desfasadas (SELECT ... FOR UPDATE) y recién entonces vuelve a leerlas y a
+        recalcular sus valores. Un incremento concurrente con F() espera al bloqueo y se aplica
+        sobre el valor reparado, en vez de perderse bajo un valor calculado antes.
+        """
+        with transaction.atomic():
+            filas = list(modelo.objects.select_for_update().filter(id__in=ids).order_by('id').values('id', *campos))
+            calculados = esperado(ids)
+            desfasados = self.comparar(filas, campos, calculados)
+            modelo.objects.bulk_update(
+                [modelo(id=fila_id, **{c: calculados.get(fila_id, {}).get(c, 0) for c in campos}) for fila_id in desfasados],
+                campos, batch_size=self.lote,
+            )
+
+    def esperado_servicios(self, ids):
+        vivos = _agrupar(DetalleReserva.objects.all(), 'servicio_id', ids, n=Count('id'), importe=IMPORTE)
+        archivados = _agrupar(DetalleReservaArchivado.objects.all(), 'servicio_id', ids, n=Count('id'), importe=IMPORTE)
+        resultado = {}
+        for servicio_id in ids:
+            v = vivos.get(servicio_id, {})
+            a = archivados.get(servicio_id, {})
+            resultado[servicio_id] = {
+                'veces_reservado': v.get('n', 0) + a.get('n', 0),
+                'ingresos': (v.get('importe') or Decimal('0')) + (a.get('importe') or Decimal('0')),
+            }
+        return resultado
+
+    def esperado_reservas(self, ids):
+        return {
+            reserva_id: {'cantidad_items': fila['n'], 'total_calculado': fila['importe'] or Decimal('0')}
+            for reserva_id, fila in _agrupar(DetalleReserva.objects.all(), 'reserva_id', ids, n=Count('id'), importe=IMPORTE).items()
+        }
+
+    def esperado_usuarios(self, ids):
+        vivas = _agrupar(Reserva.objects.all(), 'usuario_id', ids, n=Count('id'))
+        archivadas = _agrupar(ReservaArchivada.objects.all(), 'usuario_id', ids, n=Count('id'))
+        return {
+            usuario_id: {'cantidad_reservas': vivas.get(usuario_id, {}).get('n', 0) + archivadas.get(usuario_id, {}).get('n', 0)}
+            for usuario_id in ids
+        }
+
+    def verificar_totales(self):
+        """
+        Reporta (sin corregir) las reservas cuyo total cobrado no coincide con la suma de sus líneas.
+        """
+        distintos = Reserva.objects.filter(cantidad_items__gt=0).exclude(total=F('total_calculado')).count()
+        if distintos:
+            self.desfases['Reserva.total distinto de total_calculado'] += distintos
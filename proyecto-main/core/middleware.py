@@ -0,0 +1,37 @@
+# core/middleware.py
+
+import time
+
+from django.conf import settings
+
+from . import router
+
+# Clave de sesión con el timestamp hasta el que las lecturas van a la primaria
+SESION_FIJAR_PRIMARIA = '_fijar_primaria_hasta'
+
+
+class ReplicaMiddleware:
+    """
+    Después de una petición que escribió, fija la sesión a la base primaria por
+    REPLICA_FIJAR_SEGUNDOS para que el usuario vea sus propios cambios (por ejemplo en 'perfil')
+    aunque la réplica vaya atrasada.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICAS:
+            return self.get_response(request)
+
+        fijada = request.session.get(SESION_FIJAR_PRIMARIA, 0) > time.time()
+        token_fijada = router._primaria_fijada.set(fijada)
+        token_escritura = router._hubo_escritura.set(False)
+        try:
+            response = self.get_response(request)
+            if router._hubo_escritura.get():
+                request.session[SESION_FIJAR_PRIMARIA] = time.time() + settings.REPLICA_FIJAR_SEGUNDOS
+        finally:
+            router._primaria_fijada.reset(token_fijada)
+            router._hubo_escritura.reset(token_escritura)
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_tarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicio',
+            name='cobro_por_noche',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='recargo_fin_de_semana',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.CreateModel(
+            name='Descuento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('noches', 'Por cantidad de noches'), ('cantidad', 'Por cantidad de unidades')], max_length=20)),
+                ('minimo', models.PositiveIntegerField()),
+                ('porcentaje', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('servicio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='descuentos', to='core.servicio')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TarifaTemporada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_fin_de_semana', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarifas', to='core.servicio')),
+            ],
+            options={
+                'verbose_name': 'Tarifa de Temporada',
+                'verbose_name_plural': 'Tarifas de Temporada',
+            },
+        ),
+    ]
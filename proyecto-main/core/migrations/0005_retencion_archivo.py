@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copiar_fecha_creacion(apps, schema_editor):
+    # Los carritos existentes toman su fecha de creación como última actividad
+    Carrito = apps.get_model('core', 'Carrito')
+    Carrito.objects.update(fecha_actualizacion=models.F('fecha_creacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_versionrecurso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copiar_fecha_creacion, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ReservaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_reserva', models.DateTimeField()),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('estado', models.CharField(blank=True, max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva Archivada',
+                'verbose_name_plural': 'Reservas Archivadas',
+            },
+        ),
+        migrations.CreateModel(
+            name='PagoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('metodo_pago', models.CharField(blank=True, max_length=100)),
+                ('estado_pago', models.CharField(blank=True, max_length=50)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fecha_pago', models.DateTimeField()),
+                ('reserva', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pago', to='core.reservaarchivada')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DetalleReservaArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('servicio_nombre', models.CharField(max_length=200)),
+                ('tipo_servicio_nombre', models.CharField(max_length=100)),
+                ('cantidad', models.IntegerField(default=1)),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('servicio', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.servicio')),
+                ('reserva', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='core.reservaarchivada')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reservaarchivada',
+            index=models.Index(fields=['usuario', 'fecha_reserva'], name='reserva_arch_usuario_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:32
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def _agregado(queryset, campo, expresion, output_field):
+    # Subconsulta correlacionada que agrega `expresion` sobre las filas de `queryset` agrupadas por `campo`
+    return Coalesce(
+        Subquery(queryset.filter(**{campo: OuterRef('pk')}).values(campo).annotate(v=expresion).values('v')),
+        0, output_field=output_field,
+    )
+
+
+def calcular_contadores(apps, schema_editor):
+    # Llena los contadores nuevos a partir de los datos existentes (incluye el archivo)
+    Usuario = apps.get_model('core', 'Usuario')
+    Servicio = apps.get_model('core', 'Servicio')
+    Reserva = apps.get_model('core', 'Reserva')
+    DetalleReserva = apps.get_model('core', 'DetalleReserva')
+    ReservaArchivada = apps.get_model('core', 'ReservaArchivada')
+    DetalleReservaArchivado = apps.get_model('core', 'DetalleReservaArchivado')
+    entero = models.IntegerField()
+    decimal = models.DecimalField(max_digits=14, decimal_places=2)
+    importe = Sum(F('cantidad') * F('precio_unitario'), output_field=decimal)
+
+    Usuario.objects.update(cantidad_reservas=(
+        _agregado(Reserva.objects.all(), 'usuario', Count('id'), entero)
+        + _agregado(ReservaArchivada.objects.all(), 'usuario', Count('id'), entero)
+    ))
+    Servicio.objects.update(
+        veces_reservado=(
+            _agregado(DetalleReserva.objects.all(), 'servicio', Count('id'), entero)
+            + _agregado(DetalleReservaArchivado.objects.all(), 'servicio', Count('id'), entero)
+        ),
+        ingresos=(
+            _agregado(DetalleReserva.objects.all(), 'servicio', importe, decimal)
+            + _agregado(DetalleReservaArchivado.objects.all(), 'servicio', importe, decimal)
+        ),
+    )
+    Reserva.objects.update(
+        cantidad_items=_agregado(DetalleReserva.objects.all(), 'reserva', Count('id'), entero),
+        total_calculado=_agregado(DetalleReserva.objects.all(), 'reserva', importe, decimal),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_retencion_archivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='total_calculado',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='ingresos',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='veces_reservado',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='cantidad_reservas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
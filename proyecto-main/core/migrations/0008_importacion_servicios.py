@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recomendaciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicio',
+            name='imagen',
+            field=models.FileField(blank=True, upload_to='servicios/'),
+        ),
+        migrations.AddField(
+            model_name='servicio',
+            name='miniatura',
+            field=models.FileField(blank=True, upload_to='servicios/miniaturas/'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicio',
+            constraint=models.UniqueConstraint(fields=('anfitrion', 'nombre'), name='servicio_unico_por_anfitrion'),
+        ),
+    ]
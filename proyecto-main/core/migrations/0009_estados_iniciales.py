@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:05
+
+from django.db import migrations
+
+# Copia de las constantes de core/estados.py (las migraciones no deben importar código de la app)
+ESTADOS_RESERVA = ['Pendiente', 'Confirmado', 'Cancelado', 'Completado']
+ESTADOS_PAGO = ['Pendiente', 'Aprobado', 'Rechazado', 'Reembolsado']
+
+
+def crear_estados(apps, schema_editor):
+    # Crea por adelantado los estados que usa la máquina de estados, para que nunca se inserten
+    # dentro de la transacción de una transición (si esta hace rollback, la caché quedaría con un id falso)
+    for nombre_modelo, estados in (('EstadoReserva', ESTADOS_RESERVA), ('EstadoPago', ESTADOS_PAGO)):
+        modelo = apps.get_model('core', nombre_modelo)
+        existentes = set(modelo.objects.filter(estado__in=estados).values_list('estado', flat=True))
+        modelo.objects.bulk_create([modelo(estado=estado) for estado in estados if estado not in existentes])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_importacion_servicios'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_estados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:47
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_estados_iniciales'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='descuento',
+            name='porcentaje',
+            field=models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddConstraint(
+            model_name='descuento',
+            constraint=models.CheckConstraint(condition=models.Q(('porcentaje__gte', 0), ('porcentaje__lte', 100)), name='descuento_porcentaje_0_100'),
+        ),
+    ]
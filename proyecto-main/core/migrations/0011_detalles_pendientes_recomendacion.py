@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def marcar_pendientes(apps, schema_editor):
+    # Los detalles sobre la antigua marca de agua (o todos, si nunca se indexó) quedan pendientes de indexar
+    IndiceRecomendaciones = apps.get_model('core', 'IndiceRecomendaciones')
+    DetalleReserva = apps.get_model('core', 'DetalleReserva')
+    DetallePendienteRecomendacion = apps.get_model('core', 'DetallePendienteRecomendacion')
+    indice = IndiceRecomendaciones.objects.order_by('id').first()
+    marca = indice.ultimo_detalle_id if indice else 0
+    detalles = DetalleReserva.objects.filter(id__gt=marca).values_list('id', 'reserva_id', 'servicio_id')
+    DetallePendienteRecomendacion.objects.bulk_create(
+        (DetallePendienteRecomendacion(detalle_id=detalle_id, reserva_id=reserva_id, servicio_id=servicio_id)
+         for detalle_id, reserva_id, servicio_id in detalles.iterator(chunk_size=5000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_descuento_porcentaje'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetallePendienteRecomendacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reserva_id', models.BigIntegerField(db_index=True)),
+                ('servicio_id', models.BigIntegerField()),
+                ('detalle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.detallereserva')),
+            ],
+        ),
+        migrations.RunPython(marcar_pendientes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='indicerecomendaciones',
+            name='ultimo_detalle_id',
+        ),
+    ]
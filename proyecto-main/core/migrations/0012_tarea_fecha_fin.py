@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def completar_fecha_fin(apps, schema_editor):
+    # Para las tareas ya terminadas, la mejor aproximación disponible es el momento programado
+    Tarea = apps.get_model('core', 'Tarea')
+    Tarea.objects.filter(estado__in=['completada', 'fallida']).update(fecha_fin=F('ejecutar_despues'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_detalles_pendientes_recomendacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarea',
+            name='fecha_fin',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(completar_fecha_fin, migrations.RunPython.noop),
+    ]
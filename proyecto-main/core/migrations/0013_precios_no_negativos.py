@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:06
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tarea_fecha_fin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='servicio',
+            name='precio',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='servicio',
+            name='recargo_fin_de_semana',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='tarifatemporada',
+            name='precio',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='tarifatemporada',
+            name='precio_fin_de_semana',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddConstraint(
+            model_name='servicio',
+            constraint=models.CheckConstraint(condition=models.Q(('precio__gte', 0)), name='servicio_precio_no_negativo'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicio',
+            constraint=models.CheckConstraint(condition=models.Q(('recargo_fin_de_semana__gte', 0)), name='servicio_recargo_no_negativo'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarifatemporada',
+            constraint=models.CheckConstraint(condition=models.Q(('precio__gte', 0)), name='tarifa_precio_no_negativo'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarifatemporada',
+            constraint=models.CheckConstraint(condition=models.Q(('precio_fin_de_semana__gte', 0), ('precio_fin_de_semana__isnull', True), _connector='OR'), name='tarifa_precio_fin_de_semana_no_negativo'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarifatemporada',
+            constraint=models.CheckConstraint(condition=models.Q(('fecha_fin__gte', models.F('fecha_inicio'))), name='tarifa_fechas_ordenadas'),
+        ),
+    ]
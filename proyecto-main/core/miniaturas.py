@@ -0,0 +1,21 @@
+# core/miniaturas.py
+# Código que corre en los procesos del pool de miniaturas (ver core/importacion.py).
+# No importa nada de Django: los procesos se crean con spawn y no tienen la app configurada.
+
+try:
+    from PIL import Image
+except ImportError: # Pillow es opcional: sin él se importan los servicios pero no se generan miniaturas
+    Image = None
+
+
+def crear_miniatura(origen, destino, tamano):
+    """
+    Se ejecuta en un proceso aparte. Retorna None si todo salió bien o el mensaje de error.
+    """
+    try:
+        with Image.open(origen) as imagen:
+            imagen.thumbnail(tamano)
+            imagen.convert('RGB').save(destino, 'JPEG', quality=85)
+    except Exception as e: # Una imagen dañada no debe cortar las demás
+        return str(e)
+    return None
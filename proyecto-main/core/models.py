@@ -1,7 +1,10 @@
 # core/models.py
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError # Importar para manejar errores de integridad
 
 
@@ -68,6 +71,7 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True) # Indica si la cuenta está activa
     is_staff = models.BooleanField(default=False) # Necesario para acceder al admin de Django
     date_joined = models.DateTimeField(auto_now_add=True) # Fecha de creación del usuario
+    cantidad_reservas = models.PositiveIntegerField(default=0) # Desnormalizado, incluye archivadas (ver core/contadores.py)
 
     objects = UsuarioManager() # Asigna tu Manager personalizado
 
@@ -138,13 +142,79 @@ class TipoServicio(models.Model):
 class Servicio(models.Model):
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField()
-    precio = models.DecimalField(max_digits=10, decimal_places=2)
+    precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     tipo_servicio = models.ForeignKey(TipoServicio, on_delete=models.CASCADE)
     anfitrion = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='servicios_ofrecidos') 
+    cobro_por_noche = models.BooleanField(default=True) # Si es False, el precio se cobra una vez por unidad
+    recargo_fin_de_semana = models.DecimalField(max_digits=5, decimal_places=2, default=0,
+                                                validators=[MinValueValidator(0)]) # Porcentaje para viernes y sábado
+    # Desnormalizados, incluyen reservas archivadas (ver core/contadores.py)
+    veces_reservado = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    imagen = models.FileField(upload_to='servicios/', blank=True)
+    miniatura = models.FileField(upload_to='servicios/miniaturas/', blank=True) # Generada por core/importacion.py
+
+    class Meta:
+        constraints = [
+            # Clave de la importación masiva: volver a subir el mismo nombre actualiza el servicio
+            models.UniqueConstraint(fields=['anfitrion', 'nombre'], name='servicio_unico_por_anfitrion'),
+            # Un precio o recargo negativo daría cotizaciones negativas (ver core/precios.py)
+            models.CheckConstraint(condition=models.Q(precio__gte=0), name='servicio_precio_no_negativo'),
+            models.CheckConstraint(condition=models.Q(recargo_fin_de_semana__gte=0), name='servicio_recargo_no_negativo'),
+        ]
 
     def __str__(self):
         return self.nombre
 
+class TarifaTemporada(models.Model):
+    servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='tarifas')
+    nombre = models.CharField(max_length=100, blank=True) # Ej: 'Temporada alta'
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField() # Inclusive
+    precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    precio_fin_de_semana = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                               validators=[MinValueValidator(0)]) # Si es nulo se usa el recargo del servicio
+
+    class Meta:
+        verbose_name = "Tarifa de Temporada"
+        verbose_name_plural = "Tarifas de Temporada"
+        constraints = [
+            models.CheckConstraint(condition=models.Q(precio__gte=0), name='tarifa_precio_no_negativo'),
+            models.CheckConstraint(condition=models.Q(precio_fin_de_semana__gte=0) | models.Q(precio_fin_de_semana__isnull=True),
+                                   name='tarifa_precio_fin_de_semana_no_negativo'),
+            # Una temporada invertida no cubriría ningún día y se ignoraría sin aviso
+            models.CheckConstraint(condition=models.Q(fecha_fin__gte=models.F('fecha_inicio')), name='tarifa_fechas_ordenadas'),
+        ]
+
+    def clean(self):
+        if self.fecha_inicio and self.fecha_fin and self.fecha_fin < self.fecha_inicio:
+            raise ValidationError({'fecha_fin': 'La fecha de término no puede ser anterior a la de inicio.'})
+
+    def __str__(self):
+        return f"{self.servicio.nombre}: {self.nombre or 'Temporada'} ({self.fecha_inicio} - {self.fecha_fin})"
+
+class Descuento(models.Model):
+    POR_NOCHES = 'noches'
+    POR_CANTIDAD = 'cantidad'
+    TIPOS = [
+        (POR_NOCHES, 'Por cantidad de noches'),
+        (POR_CANTIDAD, 'Por cantidad de unidades'),
+    ]
+
+    servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='descuentos', null=True, blank=True) # Nulo = aplica a todos
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    minimo = models.PositiveIntegerField() # Noches o unidades mínimas para aplicar el descuento
+    porcentaje = models.DecimalField(max_digits=5, decimal_places=2,
+                                     validators=[MinValueValidator(0), MaxValueValidator(100)]) # Más de 100 daría totales negativos
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(porcentaje__gte=0, porcentaje__lte=100), name='descuento_porcentaje_0_100'),
+        ]
+
+    def __str__(self):
+        return f"{self.porcentaje}% desde {self.minimo} {self.tipo}"
+
 class EstadoReserva(models.Model):
     estado = models.CharField(max_length=50)
     def __str__(self):
@@ -157,10 +227,18 @@ class Reserva(models.Model):
     fecha_fin = models.DateField()
     estado = models.ForeignKey(EstadoReserva, on_delete=models.SET_NULL, null=True)
     total = models.DecimalField(max_digits=10, decimal_places=2)
+    # Desnormalizados desde DetalleReserva (ver core/contadores.py)
+    total_calculado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cantidad_items = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Reserva {self.id} - {self.usuario.correo}"
 
+    def save(self, *args, **kwargs):
+        # Los contadores se actualizan en señales; así quedan en la misma transacción que el INSERT/UPDATE
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class DetalleReserva(models.Model):
     reserva = models.ForeignKey(Reserva, on_delete=models.CASCADE)
     servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE)
@@ -170,9 +248,14 @@ class DetalleReserva(models.Model):
     def __str__(self):
         return f"Detalle de Reserva {self.reserva.id} - {self.servicio.nombre}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class Carrito(models.Model):
     usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE) 
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now, db_index=True) # Última actividad (ver DetalleCarrito.save)
     activo = models.BooleanField(default=True)
 
     def __str__(self):
@@ -186,6 +269,11 @@ class DetalleCarrito(models.Model):
     def __str__(self):
         return f"Item en carrito {self.carrito.id} - {self.servicio.nombre}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Cualquier cambio en los items cuenta como actividad del carrito (ver core/retencion.py)
+        Carrito.objects.filter(id=self.carrito_id).update(fecha_actualizacion=timezone.now())
+
 class MetodoPago(models.Model):
     nombre = models.CharField(max_length=100)
     def __str__(self):
@@ -204,4 +292,158 @@ class Pago(models.Model):
     fecha_pago = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Pago {self.id} - {self.reserva.usuario.correo}"
\ No newline at end of file
+        return f"Pago {self.id} - {self.reserva.usuario.correo}"
+
+# --- Cola de tareas en segundo plano ---
+
+class Tarea(models.Model):
+    """
+    Trabajo pendiente para la cola local (ver core/cola.py).
+    Los workers de `manage.py procesar_tareas` reclaman y ejecutan estas filas.
+    """
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    ]
+
+    nombre = models.CharField(max_length=100) # Nombre registrado de la tarea
+    argumentos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    ejecutar_despues = models.DateTimeField(default=timezone.now) # Permite programar tareas a futuro
+    bloqueada_en = models.DateTimeField(null=True, blank=True) # Momento en que un worker la reclamó
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True) # Cuándo quedó completada o fallida
+
+    class Meta:
+        verbose_name = "Tarea"
+        verbose_name_plural = "Tareas"
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_despues'], name='tarea_estado_ejecutar_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tarea {self.id} - {self.nombre} ({self.estado})"
+
+# --- Versiones por recurso (ETag de la API JSON) ---
+
+class VersionRecurso(models.Model):
+    """
+    Contador que se incrementa cada vez que cambia un recurso (ver core/versiones.py).
+    La API lo usa para calcular el ETag sin ejecutar la consulta principal.
+    """
+    clave = models.CharField(max_length=100, unique=True) # Ej: 'servicios', 'reservas:15'
+    version = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Versión de Recurso"
+        verbose_name_plural = "Versiones de Recursos"
+
+    def __str__(self):
+        return f"{self.clave} v{self.version}"
+
+
+# --- Archivo histórico (ver core/retencion.py) ---
+# Copias desnormalizadas de reservas antiguas, con los mismos ids que tenían en las tablas principales.
+
+class ReservaArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey('Usuario', on_delete=models.CASCADE, related_name='reservas_archivadas')
+    fecha_reserva = models.DateTimeField()
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    estado = models.CharField(max_length=50, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Reserva Archivada"
+        verbose_name_plural = "Reservas Archivadas"
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_reserva'], name='reserva_arch_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reserva archivada {self.id}"
+
+class DetalleReservaArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    reserva = models.ForeignKey(ReservaArchivada, on_delete=models.CASCADE, related_name='detalles')
+    servicio = models.ForeignKey(Servicio, on_delete=models.SET_NULL, null=True) # El servicio puede dejar de existir
+    servicio_nombre = models.CharField(max_length=200)
+    tipo_servicio_nombre = models.CharField(max_length=100)
+    cantidad = models.IntegerField(default=1)
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"Detalle archivado {self.reserva_id} - {self.servicio_nombre}"
+
+class PagoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    reserva = models.OneToOneField(ReservaArchivada, on_delete=models.CASCADE, related_name='pago')
+    metodo_pago = models.CharField(max_length=100, blank=True)
+    estado_pago = models.CharField(max_length=50, blank=True)
+    monto = models.DecimalField(max_digits=10, decimal_places=2)
+    fecha_pago = models.DateTimeField()
+
+    def __str__(self):
+        return f"Pago archivado {self.id}"
+
+# --- Recomendaciones "Los clientes también reservaron" (ver core/recomendaciones.py) ---
+
+class CoocurrenciaServicio(models.Model):
+    """
+    Celda de la matriz dispersa servicio x servicio: cuántas reservas incluyen a ambos.
+    Se guarda en las dos direcciones (a, b) y (b, a) para leer los vecinos de un servicio con un filtro.
+    """
+    servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='+')
+    otro = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='+')
+    veces = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['servicio', 'otro'], name='coocurrencia_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.servicio_id} - {self.otro_id}: {self.veces}"
+
+class RecomendacionServicio(models.Model):
+    """
+    Los K vecinos más frecuentes de un servicio, precalculados: una sola fila por servicio.
+    """
+    servicio = models.OneToOneField(Servicio, on_delete=models.CASCADE, primary_key=True, related_name='recomendacion')
+    recomendados = models.JSONField(default=list) # Pares [servicio_id, veces], del más al menos frecuente
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recomendaciones para {self.servicio_id}"
+
+class IndiceRecomendaciones(models.Model):
+    """
+    Fila única que se bloquea (SELECT ... FOR UPDATE) para que dos indexaciones no corran a la vez.
+    """
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Índice de recomendaciones ({self.fecha_actualizacion:%d/%m/%Y %H:%M})"
+
+class DetallePendienteRecomendacion(models.Model):
+    """
+    DetalleReserva aún no contado en la matriz. Se inserta en la misma transacción que el detalle,
+    así que aparece recién cuando este confirma, sin importar el orden de los ids.
+    """
+    detalle = models.OneToOneField(DetalleReserva, on_delete=models.CASCADE, related_name='+')
+    reserva_id = models.BigIntegerField(db_index=True)
+    servicio_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Detalle {self.detalle_id} pendiente de indexar"
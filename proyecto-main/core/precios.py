@@ -0,0 +1,240 @@
+# core/precios.py
+
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_save
+
+from .models import Descuento, Servicio, TarifaTemporada
+
+# Noches que se cobran como fin de semana (date.weekday(): 4 = viernes, 5 = sábado)
+DIAS_FIN_DE_SEMANA = (4, 5)
+
+LineaCotizacion = namedtuple('LineaCotizacion', ['servicio_id', 'cantidad', 'precio_unitario', 'total'])
+
+
+def a_centavos(valor):
+    """
+    Convierte un Decimal con 2 decimales a centavos enteros.
+    """
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def a_decimal(centavos):
+    """
+    Convierte centavos enteros a Decimal con 2 decimales (para guardar en los modelos).
+    """
+    return Decimal(centavos).scaleb(-2)
+
+
+def aplicar_porcentaje(centavos, puntos_base):
+    """
+    Aplica un porcentaje expresado en puntos base (1% = 100) con redondeo half-up,
+    usando solo aritmética entera.
+    """
+    return (centavos * (10000 + puntos_base) + 5000) // 10000
+
+
+def _puntos_base(porcentaje):
+    return int((Decimal(porcentaje) * 100).to_integral_value())
+
+
+class TablaTarifas:
+    """
+    Tarifas de un servicio precalculadas como calendarios anuales de centavos por noche.
+    Cotizar una estadía se reduce a sumar una porción del calendario.
+    """
+
+    def __init__(self, servicio, temporadas, descuentos):
+        self.servicio_id = servicio['id']
+        self.cobro_por_noche = servicio['cobro_por_noche']
+        self.precio_base = a_centavos(servicio['precio'])
+        self.recargo = _puntos_base(servicio['recargo_fin_de_semana'])
+        # (inicio, fin inclusive, centavos, centavos fin de semana); las posteriores tienen prioridad
+        self.temporadas = [
+            (t['fecha_inicio'], t['fecha_fin'], a_centavos(t['precio']),
+             a_centavos(t['precio_fin_de_semana']) if t['precio_fin_de_semana'] is not None else None)
+            for t in sorted(temporadas, key=lambda t: (t['fecha_inicio'], t['id']))
+        ]
+        self.descuentos_noches = self._ordenar(descuentos, Descuento.POR_NOCHES)
+        self.descuentos_cantidad = self._ordenar(descuentos, Descuento.POR_CANTIDAD)
+        self._anios = {}
+
+    @staticmethod
+    def _ordenar(descuentos, tipo):
+        # Del mínimo más alto al más bajo, para quedarse con el primero que aplique
+        return sorted(
+            ((d['minimo'], _puntos_base(d['porcentaje'])) for d in descuentos if d['tipo'] == tipo),
+            reverse=True,
+        )
+
+    @staticmethod
+    def _descuento(descuentos, valor):
+        for minimo, puntos in descuentos:
+            if valor >= minimo:
+                return puntos
+        return 0
+
+    def _calendario_anual(self, anio):
+        """
+        Precio en centavos de cada noche del año. Se arma con asignaciones por porciones
+        (cal[a:b] y cal[a:b:7]) en vez de recorrer día por día.
+        """
+        cal = self._anios.get(anio)
+        if cal is not None:
+            return cal
+        inicio = date(anio, 1, 1)
+        largo = (date(anio + 1, 1, 1) - inicio).days
+        cal = [self.precio_base] * largo
+        self._marcar_fin_de_semana(cal, inicio, 0, largo, aplicar_porcentaje(self.precio_base, self.recargo))
+
+        for t_inicio, t_fin, precio, precio_finde in self.temporadas:
+            a = max((t_inicio - inicio).days, 0)
+            b = min((t_fin - inicio).days + 1, largo)
+            if a >= b:
+                continue
+            cal[a:b] = [precio] * (b - a)
+            if precio_finde is None:
+                precio_finde = aplicar_porcentaje(precio, self.recargo)
+            self._marcar_fin_de_semana(cal, inicio, a, b, precio_finde)
+
+        self._anios[anio] = cal
+        return cal
+
+    @staticmethod
+    def _marcar_fin_de_semana(cal, inicio, a, b, precio):
+        for dia in DIAS_FIN_DE_SEMANA:
+            primero = a + (dia - (inicio + timedelta(days=a)).weekday()) % 7
+            if primero < b:
+                cal[primero:b:7] = [precio] * len(range(primero, b, 7))
+
+    def calendario(self, desde, hasta):
+        """
+        Lista con el precio en centavos de cada noche en [desde, hasta).
+        """
+        resultado = []
+        for anio in range(desde.year, hasta.year + 1):
+            inicio_anio = date(anio, 1, 1)
+            a = (max(desde, inicio_anio) - inicio_anio).days
+            b = (min(hasta, date(anio + 1, 1, 1)) - inicio_anio).days
+            if a < b:
+                resultado.extend(self._calendario_anual(anio)[a:b])
+        return resultado
+
+    def precio_unitario(self, fecha_inicio, fecha_fin):
+        """
+        Precio en centavos de una unidad del servicio para la estadía, con descuento por noches.
+        """
+        if not self.cobro_por_noche:
+            return self.calendario(fecha_inicio, fecha_inicio + timedelta(days=1))[0]
+        noches = max((fecha_fin - fecha_inicio).days, 1)
+        subtotal = sum(self.calendario(fecha_inicio, fecha_inicio + timedelta(days=noches)))
+        return aplicar_porcentaje(subtotal, -self._descuento(self.descuentos_noches, noches))
+
+    def total(self, precio_unitario, cantidad):
+        """
+        Total en centavos de `cantidad` unidades, con descuento por cantidad.
+        """
+        return aplicar_porcentaje(precio_unitario * cantidad, -self._descuento(self.descuentos_cantidad, cantidad))
+
+
+# --- Caché de tablas por servicio ---
+
+_tablas = {}
+_candado = threading.Lock()
+
+
+def tablas_tarifas(servicio_ids):
+    """
+    Retorna {servicio_id: TablaTarifas}. Las tablas que faltan en la caché se cargan juntas
+    con una consulta por modelo.
+    """
+    servicio_ids = set(servicio_ids)
+    faltantes = servicio_ids - _tablas.keys()
+    if faltantes:
+        servicios = Servicio.objects.filter(id__in=faltantes).values(
+            'id', 'precio', 'cobro_por_noche', 'recargo_fin_de_semana'
+        )
+        temporadas = {}
+        for t in TarifaTemporada.objects.filter(servicio_id__in=faltantes).values(
+            'id', 'servicio_id', 'fecha_inicio', 'fecha_fin', 'precio', 'precio_fin_de_semana'
+        ):
+            temporadas.setdefault(t['servicio_id'], []).append(t)
+        descuentos = {}
+        generales = []
+        for d in Descuento.objects.filter(servicio_id__in=faltantes).values('servicio_id', 'tipo', 'minimo', 'porcentaje'):
+            descuentos.setdefault(d['servicio_id'], []).append(d)
+        for d in Descuento.objects.filter(servicio__isnull=True).values('servicio_id', 'tipo', 'minimo', 'porcentaje'):
+            generales.append(d)
+
+        nuevas = {
+            s['id']: TablaTarifas(s, temporadas.get(s['id'], []), descuentos.get(s['id'], []) + generales)
+            for s in servicios
+        }
+        with _candado:
+            _tablas.update(nuevas)
+    return {sid: _tablas[sid] for sid in servicio_ids if sid in _tablas}
+
+
+def limpiar_cache(sender=None, instance=None, **kwargs):
+    """
+    Invalida la tabla del servicio modificado (o todas, si cambia un descuento general).
+    """
+    servicio_id = instance.id if sender is Servicio else getattr(instance, 'servicio_id', None)
+    with _candado:
+        if servicio_id is None:
+            _tablas.clear()
+        else:
+            _tablas.pop(servicio_id, None)
+
+
+for _modelo in (Servicio, TarifaTemporada, Descuento):
+    post_save.connect(limpiar_cache, sender=_modelo, dispatch_uid=f'cache_precios_save_{_modelo.__name__}')
+    post_delete.connect(limpiar_cache, sender=_modelo, dispatch_uid=f'cache_precios_delete_{_modelo.__name__}')
+
+
+# --- API pública ---
+
+def calendario_precios(servicio_ids, desde, hasta):
+    """
+    Precio diario (en centavos) de cada servicio entre `desde` y `hasta` (exclusivo).
+    Retorna {servicio_id: [centavos, ...]}.
+    """
+    return {sid: tabla.calendario(desde, hasta) for sid, tabla in tablas_tarifas(servicio_ids).items()}
+
+
+class Cotizacion:
+    """
+    Resultado de cotizar un carrito. Los montos están en centavos enteros;
+    usar a_decimal() para guardarlos en Reserva/DetalleReserva.
+    """
+
+    def __init__(self, fecha_inicio, fecha_fin, lineas):
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.lineas = lineas
+        self.total = sum(linea.total for linea in lineas)
+
+    @property
+    def total_decimal(self):
+        return a_decimal(self.total)
+
+
+def cotizar(items, fecha_inicio, fecha_fin):
+    """
+    Cotiza un carrito para una estadía.
+    `items` es una lista de pares (servicio_id, cantidad).
+    """
+    if fecha_fin < fecha_inicio:
+        raise ValueError('La fecha de término no puede ser anterior a la de inicio.')
+    tablas = tablas_tarifas(servicio_id for servicio_id, cantidad in items)
+    lineas = []
+    for servicio_id, cantidad in items:
+        tabla = tablas.get(servicio_id)
+        if tabla is None:
+            raise Servicio.DoesNotExist(f'No existe el servicio {servicio_id}.')
+        unitario = tabla.precio_unitario(fecha_inicio, fecha_fin)
+        lineas.append(LineaCotizacion(servicio_id, cantidad, unitario, tabla.total(unitario, cantidad)))
+    return Cotizacion(fecha_inicio, fecha_fin, lineas)
@@ -0,0 +1,211 @@
+# core/recomendaciones.py
+
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .cola import encolar
+from .models import (
+    CoocurrenciaServicio, DetalleCarrito, DetallePendienteRecomendacion, DetalleReserva, DetalleReservaArchivado,
+    IndiceRecomendaciones, RecomendacionServicio, Servicio, Tarea,
+)
+
+TOP_K = 10 # Vecinos guardados por servicio
+LOTE = 5000 # Detalles leídos por consulta
+RETRASO_ACTUALIZACION = timedelta(seconds=30) # Junta los detalles que llegan seguidos en una sola pasada
+
+
+def _servicios_por_reserva(filas):
+    """
+    Agrupa filas (reserva_id, servicio_id) ordenadas por reserva en conjuntos de servicios.
+    """
+    for reserva_id, grupo in groupby(filas, key=itemgetter(0)):
+        yield reserva_id, {servicio_id for _, servicio_id in grupo}
+
+
+def _top_k(celdas, k=TOP_K):
+    """
+    {servicio: [[otro, veces], ...]} con los k vecinos más frecuentes de cada servicio
+    a partir de tuplas (servicio, otro, veces). Desempata por id para que sea estable.
+    """
+    vecinos = defaultdict(list)
+    for servicio, otro, veces in celdas:
+        vecinos[servicio].append((veces, -otro))
+    return {
+        servicio: [[-menos_otro, veces] for veces, menos_otro in heapq.nlargest(k, candidatos)]
+        for servicio, candidatos in vecinos.items()
+    }
+
+
+def _guardar_top_k(top):
+    RecomendacionServicio.objects.bulk_create(
+        [RecomendacionServicio(servicio_id=servicio, recomendados=lista) for servicio, lista in top.items()],
+        update_conflicts=True, unique_fields=['servicio'], update_fields=['recomendados', 'fecha_actualizacion'],
+        batch_size=500,
+    )
+
+
+def _indice_bloqueado():
+    indice = IndiceRecomendaciones.objects.select_for_update().order_by('id').first()
+    return indice or IndiceRecomendaciones.objects.create()
+
+
+def reconstruir(lote=LOTE, k=TOP_K):
+    """
+    Recalcula toda la matriz desde cero con los detalles vigentes y archivados.
+    Cada reserva aporta 1 a cada par de servicios distintos que contiene; los pares se cuentan
+    en memoria con un Counter y se escriben con bulk_create.
+    Los detalles pendientes se excluyen en la misma consulta que lee los demás y se suman después
+    con actualizar(), así ninguno se cuenta dos veces ni se pierde.
+    """
+    with transaction.atomic():
+        indice = _indice_bloqueado()
+        conteo = Counter()
+        fuentes = (
+            DetalleReserva.objects.exclude(id__in=DetallePendienteRecomendacion.objects.values('detalle_id')),
+            DetalleReservaArchivado.objects.filter(servicio__isnull=False),
+        )
+        for detalles in fuentes:
+            filas = detalles.order_by('reserva_id').values_list('reserva_id', 'servicio_id').iterator(chunk_size=lote)
+            for reserva_id, servicios in _servicios_por_reserva(filas):
+                conteo.update(combinations(sorted(servicios), 2))
+
+        CoocurrenciaServicio.objects.all().delete()
+        CoocurrenciaServicio.objects.bulk_create(
+            (CoocurrenciaServicio(servicio_id=a, otro_id=b, veces=veces)
+             for (x, y), veces in conteo.items() for a, b in ((x, y), (y, x))),
+            batch_size=1000,
+        )
+        RecomendacionServicio.objects.all().delete()
+        _guardar_top_k(_top_k(((a, b, v) for (x, y), v in conteo.items() for a, b in ((x, y), (y, x))), k))
+        indice.save()
+    actualizar(lote, k)
+    return len(conteo)
+
+
+def actualizar(lote=LOTE, k=TOP_K):
+    """
+    Suma a la matriz los detalles pendientes (DetallePendienteRecomendacion), lote por lote,
+    y recalcula el top-k únicamente de los servicios afectados.
+    A diferencia de una marca de agua por id, no se salta detalles cuya transacción confirmó tarde.
+    Retorna cuántos detalles se procesaron.
+    """
+    procesados = 0
+    while True:
+        with transaction.atomic():
+            _indice_bloqueado()
+            pendientes = list(DetallePendienteRecomendacion.objects.order_by('id').values_list(
+                'id', 'reserva_id', 'servicio_id',
+            )[:lote])
+            if not pendientes:
+                return procesados
+
+            agregados = defaultdict(set)
+            for _, reserva_id, servicio_id in pendientes:
+                agregados[reserva_id].add(servicio_id)
+            # Lo ya contado de cada reserva: sus detalles que no están pendientes
+            # (los pendientes que no entraron en este lote se cuentan en el siguiente)
+            previos = defaultdict(set)
+            for reserva_id, servicio_id in DetalleReserva.objects.filter(reserva_id__in=agregados).exclude(
+                id__in=DetallePendienteRecomendacion.objects.filter(reserva_id__in=agregados).values('detalle_id'),
+            ).values_list('reserva_id', 'servicio_id'):
+                previos[reserva_id].add(servicio_id)
+
+            # Solo cuentan los pares que la reserva no tenía antes
+            delta = Counter()
+            for reserva_id, servicios in agregados.items():
+                antes = previos[reserva_id]
+                for a, b in combinations(sorted(antes | servicios), 2):
+                    if a not in antes or b not in antes:
+                        delta[(a, b)] += 1
+                        delta[(b, a)] += 1
+
+            if delta:
+                _aplicar_delta(delta, k)
+            DetallePendienteRecomendacion.objects.filter(id__in=[p[0] for p in pendientes]).delete()
+            procesados += len(pendientes)
+
+
+def _aplicar_delta(delta, k):
+    afectados = {a for a, b in delta}
+    existentes = {
+        (c.servicio_id, c.otro_id): c
+        for c in CoocurrenciaServicio.objects.filter(servicio_id__in=afectados, otro_id__in=afectados)
+    }
+    a_actualizar, a_crear = [], []
+    for (a, b), veces in delta.items():
+        celda = existentes.get((a, b))
+        if celda is None:
+            a_crear.append(CoocurrenciaServicio(servicio_id=a, otro_id=b, veces=veces))
+        else:
+            celda.veces += veces
+            a_actualizar.append(celda)
+    CoocurrenciaServicio.objects.bulk_update(a_actualizar, ['veces'], batch_size=500)
+    CoocurrenciaServicio.objects.bulk_create(a_crear, batch_size=500)
+
+    _guardar_top_k(_top_k(
+        CoocurrenciaServicio.objects.filter(servicio_id__in=afectados).values_list('servicio_id', 'otro_id', 'veces'), k,
+    ))
+
+
+# --- Actualización automática ---
+
+def programar_actualizacion(retraso=RETRASO_ACTUALIZACION):
+    """
+    Encola la tarea actualizar_recomendaciones si no hay ya una esperando.
+    """
+    if not Tarea.objects.filter(nombre='actualizar_recomendaciones', estado=Tarea.PENDIENTE).exists():
+        encolar('actualizar_recomendaciones', ejecutar_en=timezone.now() + retraso)
+
+
+def _detalle_creado(sender, instance, created, raw=False, **kwargs):
+    # Corre dentro de la transacción de DetalleReserva.save(): el pendiente y la tarea confirman con el detalle
+    if not created or raw:
+        return
+    DetallePendienteRecomendacion.objects.create(
+        detalle=instance, reserva_id=instance.reserva_id, servicio_id=instance.servicio_id,
+    )
+    programar_actualizacion()
+
+
+post_save.connect(_detalle_creado, sender=DetalleReserva, dispatch_uid='recomendaciones_detalle_save')
+
+
+# --- Lectura (vistas) ---
+
+def sugerencias(servicio_ids, limite=4):
+    """
+    Servicios que suelen reservarse junto con `servicio_ids` (excluyéndolos).
+    Lee una fila precalculada por servicio de entrada y luego los datos de los elegidos: 2 consultas.
+    """
+    servicio_ids = set(servicio_ids)
+    if not servicio_ids:
+        return []
+    puntaje = Counter()
+    for recomendados in RecomendacionServicio.objects.filter(servicio_id__in=servicio_ids).values_list('recomendados', flat=True):
+        for otro, veces in recomendados:
+            if otro not in servicio_ids:
+                puntaje[otro] += veces
+    elegidos = [servicio_id for servicio_id, _ in puntaje.most_common(limite)]
+    if not elegidos:
+        return []
+    datos = {
+        s['id']: s for s in Servicio.objects.filter(id__in=elegidos).values('id', 'nombre', 'precio', 'tipo_servicio__nombre')
+    }
+    return [datos[servicio_id] for servicio_id in elegidos if servicio_id in datos]
+
+
+def sugerencias_carrito(usuario, limite=4):
+    """
+    Sugerencias a partir de los servicios del carrito activo del usuario.
+    """
+    if not usuario.is_authenticated:
+        return []
+    en_carrito = DetalleCarrito.objects.filter(carrito__usuario=usuario, carrito__activo=True).values_list('servicio_id', flat=True)
+    return sugerencias(en_carrito, limite)
@@ -0,0 +1,163 @@
+# core/retencion.py
+
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from . import contadores, versiones
+from .models import (
+    Carrito, DetalleCarrito, DetalleReserva, DetalleReservaArchivado, Pago, PagoArchivado, Reserva, ReservaArchivada,
+)
+
+# Valores por defecto (se pueden cambiar por argumentos del comando aplicar_retencion)
+DIAS_CARRITO_ABANDONADO = 30 # Carritos activos sin actividad pasan a inactivos
+DIAS_PURGA_CARRITO = 90 # Carritos inactivos sin actividad se borran
+DIAS_ARCHIVO_RESERVA = 730 # Reservas terminadas hace más de esto se archivan
+LOTE = 500
+PAUSA = 0.2 # Segundos entre lotes, para no acaparar locks en horario de atención
+
+
+def _por_lotes(queryset, lote, pausa):
+    """
+    Recorre los ids de `queryset` en lotes ordenados por id (keyset: id > último visto),
+    así cada consulta usa el índice de la clave primaria y no un OFFSET creciente.
+    Entre lote y lote duerme `pausa` segundos.
+    """
+    ultimo = 0
+    while True:
+        ids = list(queryset.filter(id__gt=ultimo).order_by('id').values_list('id', flat=True)[:lote])
+        if not ids:
+            return
+        yield ids
+        ultimo = ids[-1]
+        if pausa and len(ids) == lote:
+            time.sleep(pausa)
+
+
+def abandonar_carritos(dias=DIAS_CARRITO_ABANDONADO, lote=LOTE, pausa=PAUSA):
+    """
+    Marca como inactivos los carritos sin actividad en los últimos `dias` días.
+    Retorna cuántos carritos se desactivaron.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    candidatos = Carrito.objects.filter(activo=True, fecha_actualizacion__lt=limite)
+    total = 0
+    for ids in _por_lotes(candidatos, lote, pausa):
+        with transaction.atomic():
+            # Se repite la condición: un carrito pudo recibir actividad entre la lectura y el UPDATE
+            carritos = candidatos.filter(id__in=ids)
+            usuarios = list(carritos.values_list('usuario_id', flat=True).distinct())
+            total += carritos.update(activo=False)
+            versiones.incrementar(*(versiones.clave_carrito(u) for u in usuarios))
+    return total
+
+
+def purgar_carritos(dias=DIAS_PURGA_CARRITO, lote=LOTE, pausa=PAUSA):
+    """
+    Borra (con sus items) los carritos inactivos sin actividad en los últimos `dias` días.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    candidatos = Carrito.objects.filter(activo=False, fecha_actualizacion__lt=limite)
+    total = 0
+    for ids in _por_lotes(candidatos, lote, pausa):
+        with transaction.atomic(), versiones.agrupar(silenciar_senales=True):
+            usuarios = list(Carrito.objects.filter(id__in=ids).values_list('usuario_id', flat=True).distinct())
+            borrados, por_modelo = candidatos.filter(id__in=ids).delete()
+            total += por_modelo.get(Carrito._meta.label, 0)
+            versiones.incrementar(*(versiones.clave_carrito(u) for u in usuarios))
+    return total
+
+
+def archivar_reservas(dias=DIAS_ARCHIVO_RESERVA, lote=LOTE, pausa=PAUSA):
+    """
+    Mueve a las tablas de archivo las reservas cuya fecha de término es anterior a hace `dias` días,
+    junto con sus detalles y su pago. Cada lote es una transacción corta: copia y luego borra.
+    Retorna cuántas reservas se archivaron.
+    """
+    limite = timezone.localdate() - timedelta(days=dias)
+    candidatos = Reserva.objects.filter(fecha_fin__lt=limite)
+    total = 0
+    for ids in _por_lotes(candidatos, lote, pausa):
+        with transaction.atomic(), versiones.agrupar(silenciar_senales=True):
+            reservas = list(candidatos.filter(id__in=ids).values(
+                'id', 'usuario_id', 'fecha_reserva', 'fecha_inicio', 'fecha_fin', 'estado__estado', 'total',
+            ))
+            ids = [r['id'] for r in reservas]
+            ReservaArchivada.objects.bulk_create([
+                ReservaArchivada(
+                    id=r['id'], usuario_id=r['usuario_id'], fecha_reserva=r['fecha_reserva'],
+                    fecha_inicio=r['fecha_inicio'], fecha_fin=r['fecha_fin'],
+                    estado=r['estado__estado'] or '', total=r['total'],
+                ) for r in reservas
+            ]) # Si ya hay una fila archivada con el mismo id, falla el lote completo y no se borra nada
+            DetalleReservaArchivado.objects.bulk_create([
+                DetalleReservaArchivado(
+                    id=d['id'], reserva_id=d['reserva_id'], servicio_id=d['servicio_id'],
+                    servicio_nombre=d['servicio__nombre'], tipo_servicio_nombre=d['servicio__tipo_servicio__nombre'],
+                    cantidad=d['cantidad'], precio_unitario=d['precio_unitario'],
+                ) for d in DetalleReserva.objects.filter(reserva_id__in=ids).values(
+                    'id', 'reserva_id', 'servicio_id', 'servicio__nombre', 'servicio__tipo_servicio__nombre',
+                    'cantidad', 'precio_unitario',
+                )
+            ])
+            PagoArchivado.objects.bulk_create([
+                PagoArchivado(
+                    id=p['id'], reserva_id=p['reserva_id'], metodo_pago=p['metodo_pago__nombre'] or '',
+                    estado_pago=p['estado_pago__estado'] or '', monto=p['monto'], fecha_pago=p['fecha_pago'],
+                ) for p in Pago.objects.filter(reserva_id__in=ids).values(
+                    'id', 'reserva_id', 'metodo_pago__nombre', 'estado_pago__estado', 'monto', 'fecha_pago',
+                )
+            ])
+
+            # En cascada borra detalles y pago. Los contadores incluyen el archivo, así que no se descuentan
+            with contadores.suspender():
+                Reserva.objects.filter(id__in=ids).delete()
+            versiones.incrementar(*{versiones.clave_reservas(r['usuario_id']) for r in reservas})
+            total += len(ids)
+    return total
+
+
+def _item_borrado(sender, instance, origin=None, **kwargs):
+    # Quitar un item también es actividad (agregar o cambiar uno lo registra DetalleCarrito.save),
+    # así un carrito que el usuario está editando no se abandona. Si se borra el carrito entero, no hay nada que tocar
+    if isinstance(origin, Carrito) or getattr(origin, 'model', None) is Carrito:
+        return
+    Carrito.objects.filter(id=instance.carrito_id).update(fecha_actualizacion=timezone.now())
+
+
+post_delete.connect(_item_borrado, sender=DetalleCarrito, dispatch_uid='retencion_item_borrado')
+
+
+def historial_archivado(usuario):
+    """
+    Reservas archivadas del usuario, con el mismo formato que usa la vista 'perfil'.
+    Dos consultas en total, sin importar cuántas reservas haya.
+    """
+    reservas = list(ReservaArchivada.objects.filter(usuario=usuario).order_by('-fecha_reserva').values(
+        'id', 'fecha_inicio', 'fecha_fin', 'estado', 'total',
+    ))
+    detalles = {}
+    for d in DetalleReservaArchivado.objects.filter(reserva__usuario=usuario).values(
+        'reserva_id', 'servicio_nombre', 'tipo_servicio_nombre',
+    ):
+        nombres, tipos = detalles.setdefault(d['reserva_id'], (set(), set()))
+        nombres.add(d['servicio_nombre'])
+        tipos.add(d['tipo_servicio_nombre'])
+
+    historial = []
+    for r in reservas:
+        nombres, tipos = detalles.get(r['id'], (set(), set()))
+        historial.append({
+            'id': r['id'],
+            'tipo_servicio': ", ".join(sorted(tipos)) or 'N/A',
+            'nombre_servicio': ", ".join(sorted(nombres)) or 'N/A',
+            'fecha_inicio': r['fecha_inicio'],
+            'fecha_fin': r['fecha_fin'],
+            'estado_display': r['estado'] or 'Desconocido',
+            'total': r['total'],
+            'archivada': True,
+        })
+    return historial
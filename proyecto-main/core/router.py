@@ -0,0 +1,72 @@
+# core/router.py
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Estado de la petición actual (lo maneja core.middleware.ReplicaMiddleware)
+_usar_replica = ContextVar('usar_replica', default=False) # La vista aceptó leer de una réplica
+_primaria_fijada = ContextVar('primaria_fijada', default=False) # La sesión escribió hace poco
+_hubo_escritura = ContextVar('hubo_escritura', default=False) # Se escribió durante esta petición
+_replica = ContextVar('replica', default=None) # Réplica elegida para toda la petición
+
+
+@contextmanager
+def en_replica():
+    """
+    Permite que las lecturas del bloque vayan a una réplica (catálogo, paneles de anfitrión, exportaciones).
+    La réplica se elige una sola vez al entrar, para que una misma página no mezcle réplicas
+    con distinto retraso; un bloque anidado usa la misma.
+    """
+    token = _usar_replica.set(True)
+    token_replica = _replica.set(_replica.get() or (random.choice(settings.REPLICAS) if settings.REPLICAS else None))
+    try:
+        yield
+    finally:
+        _replica.reset(token_replica)
+        _usar_replica.reset(token)
+
+
+def lectura_en_replica(vista):
+    """
+    Decorador de vistas de solo lectura que pueden tolerar unos segundos de retraso de la réplica.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        with en_replica():
+            return vista(request, *args, **kwargs)
+    return envoltura
+
+
+class RouterReplicas:
+    """
+    Envía las lecturas de la app 'core' a una réplica cuando:
+      - la vista lo permite (@lectura_en_replica / en_replica()),
+      - la sesión no escribió recientemente ni en esta misma petición (read-your-writes),
+      - no hay una transacción abierta en la primaria.
+    Todo lo demás, y siempre las escrituras, va a 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.REPLICAS or model._meta.app_label != 'core':
+            return None
+        if not _usar_replica.get() or _primaria_fijada.get() or _hubo_escritura.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return _replica.get() or random.choice(settings.REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _hubo_escritura.set(True)
+        # Explícito: si no, Django escribiría en la base de la que se leyó la instancia
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *settings.REPLICAS}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
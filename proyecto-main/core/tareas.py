@@ -0,0 +1,104 @@
+# core/tareas.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cola import tarea
+from .estados import (
+    PAGO_APROBADO, RESERVA_CONFIRMADA, TransicionInvalida,
+    estado_pago_id, transicionar_pago, transicionar_reserva,
+)
+from .importacion import generar_miniaturas as generar_miniaturas_servicios
+from .models import Pago, Reserva, Tarea
+from .recomendaciones import actualizar as actualizar_matriz_recomendaciones
+from .retencion import DIAS_CARRITO_ABANDONADO, abandonar_carritos, archivar_reservas, purgar_carritos
+
+
+@tarea(nombre='enviar_correo_confirmacion')
+def enviar_correo_confirmacion(reserva_id):
+    """
+    Envía al cliente el correo de confirmación de su reserva.
+    """
+    reserva = Reserva.objects.select_related('usuario').get(id=reserva_id)
+    send_mail(
+        subject=f'Manakea Tours - Reserva {reserva.id} confirmada',
+        message=(
+            f'Hola {reserva.usuario.nombre},\n\n'
+            f'Tu reserva del {reserva.fecha_inicio:%d/%m/%Y} al {reserva.fecha_fin:%d/%m/%Y} '
+            f'por un total de ${reserva.total:.0f} fue confirmada.\n\n'
+            '¡Gracias por viajar con Manakea Tours!'
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[reserva.usuario.correo],
+    )
+
+
+@tarea(nombre='finalizar_pago')
+def finalizar_pago(pago_id):
+    """
+    Aprueba el pago, confirma la reserva y encola el correo de confirmación.
+    Es idempotente: si el pago ya estaba aprobado no hace nada.
+    """
+    with transaction.atomic():
+        try:
+            transicionar_pago(pago_id, PAGO_APROBADO)
+        except TransicionInvalida:
+            if Pago.objects.filter(id=pago_id, estado_pago_id=estado_pago_id(PAGO_APROBADO)).exists():
+                return
+            raise
+        reserva_id = Pago.objects.filter(id=pago_id).values_list('reserva_id', flat=True).get()
+        transicionar_reserva(reserva_id, RESERVA_CONFIRMADA)
+        enviar_correo_confirmacion.encolar(reserva_id=reserva_id)
+
+
+@tarea(nombre='limpiar_carritos', cada=timedelta(hours=1))
+def limpiar_carritos(dias=DIAS_CARRITO_ABANDONADO):
+    """
+    Desactiva los carritos sin actividad en los últimos `dias` días (ver core/retencion.py).
+    """
+    abandonar_carritos(dias=dias)
+
+
+@tarea(nombre='aplicar_retencion', cada=timedelta(days=1))
+def aplicar_retencion():
+    """
+    Ejecuta toda la política de retención con los valores por defecto.
+    """
+    abandonar_carritos()
+    purgar_carritos()
+    archivar_reservas()
+
+
+@tarea(nombre='actualizar_recomendaciones')
+def actualizar_recomendaciones():
+    """
+    Suma a la matriz de co-ocurrencia los detalles de reserva pendientes. Se encola sola al crear
+    un DetalleReserva (ver core/recomendaciones.py).
+    """
+    actualizar_matriz_recomendaciones()
+
+
+@tarea(nombre='generar_miniaturas')
+def generar_miniaturas(servicio_ids):
+    """
+    Genera las miniaturas de servicios recién importados desde la vista (ver core/importacion.py).
+    """
+    generar_miniaturas_servicios(servicio_ids)
+
+
+@tarea(nombre='limpiar_tareas', cada=timedelta(days=1))
+def limpiar_tareas(dias=7, dias_fallidas=30):
+    """
+    Borra las tareas completadas hace más de `dias` días y las fallidas hace más de `dias_fallidas`
+    (se guardan más tiempo para poder revisar el error), para que la cola no crezca sin límite.
+    """
+    ahora = timezone.now()
+    Tarea.objects.filter(
+        Q(estado=Tarea.COMPLETADA, fecha_fin__lt=ahora - timedelta(days=dias))
+        | Q(estado=Tarea.FALLIDA, fecha_fin__lt=ahora - timedelta(days=dias_fallidas))
+    ).delete()
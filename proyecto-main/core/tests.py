@@ -1,3 +1,980 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import cola, estados, precios, recomendaciones, retencion, router
+from .cola import tarea
+from .importacion import importar_servicios
+from .middleware import SESION_FIJAR_PRIMARIA, ReplicaMiddleware
+from .router import RouterReplicas, en_replica
+from .estados import (
+    PAGO_APROBADO, PAGO_PENDIENTE, PAGO_RECHAZADO, PAGO_REEMBOLSADO, RESERVA_CANCELADA, RESERVA_COMPLETADA,
+    RESERVA_CONFIRMADA, RESERVA_PENDIENTE, ConflictoDeEstado, TransicionInvalida,
+    estado_pago_id, estado_reserva_id, transicionar_pago, transicionar_reserva,
+)
+from .models import (
+    Carrito, CoocurrenciaServicio, Descuento, DetalleCarrito, DetallePendienteRecomendacion, DetalleReserva, EstadoPago, EstadoReserva, Pago, PagoArchivado, Reserva, ReservaArchivada, Servicio, TarifaTemporada,
+    Tarea, TipoServicio, TipoUsuario, Usuario,
+)
+from .tareas import finalizar_pago, limpiar_tareas
+
+
+def crear_usuario(correo='cliente@manakea.cl'):
+    return Usuario.objects.create_user(correo, 'clave-segura', nombre='Ana', apellido='Pérez')
+
+
+def crear_reserva(usuario, estado=RESERVA_PENDIENTE, total=Decimal('100.00')):
+    return Reserva.objects.create(
+        usuario=usuario, fecha_inicio=date(2030, 1, 10), fecha_fin=date(2030, 1, 12),
+        total=total, estado_id=estado_reserva_id(estado) if estado else None,
+    )
+
+
+def crear_pago(reserva, estado=PAGO_PENDIENTE, monto=None):
+    return Pago.objects.create(
+        reserva=reserva, monto=reserva.total if monto is None else monto,
+        estado_pago_id=estado_pago_id(estado) if estado else None,
+    )
+
+
+def nombre_estado(obj):
+    obj.refresh_from_db()
+    estado = obj.estado if isinstance(obj, Reserva) else obj.estado_pago
+    return estado.estado if estado else None
+
+
+# --- Máquina de estados ---
+
+class TransicionesTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.usuario = crear_usuario()
+
+    def test_estados_conocidos_vienen_de_la_migracion(self):
+        self.assertEqual(
+            set(EstadoReserva.objects.values_list('estado', flat=True)),
+            {RESERVA_PENDIENTE, RESERVA_CONFIRMADA, RESERVA_CANCELADA, RESERVA_COMPLETADA},
+        )
+        self.assertEqual(
+            set(EstadoPago.objects.values_list('estado', flat=True)),
+            {PAGO_PENDIENTE, PAGO_APROBADO, PAGO_RECHAZADO, PAGO_REEMBOLSADO},
+        )
+
+    def test_transicion_permitida_retorna_estado_anterior(self):
+        reserva = crear_reserva(self.usuario)
+        self.assertEqual(transicionar_reserva(reserva.id, RESERVA_CONFIRMADA), RESERVA_PENDIENTE)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CONFIRMADA)
+
+    def test_reserva_sin_estado_se_trata_como_pendiente(self):
+        reserva = crear_reserva(self.usuario, estado=None)
+        self.assertEqual(transicionar_reserva(reserva.id, RESERVA_CANCELADA), RESERVA_PENDIENTE)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CANCELADA)
+
+    def test_transicion_no_permitida(self):
+        reserva = crear_reserva(self.usuario, estado=RESERVA_CANCELADA)
+        with self.assertRaises(TransicionInvalida):
+            transicionar_reserva(reserva.id, RESERVA_CONFIRMADA)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CANCELADA)
+
+    def test_estado_desconocido(self):
+        pago = crear_pago(crear_reserva(self.usuario))
+        with self.assertRaises(TransicionInvalida):
+            transicionar_pago(pago.id, 'Perdido')
+
+    def test_conflicto_si_el_estado_cambia_entre_lectura_y_update(self):
+        pago = crear_pago(crear_reserva(self.usuario))
+        original = estados._nombre_por_id
+
+        def leer_y_cambiar(modelo, campo, obj_id):
+            # Otro proceso rechaza el pago justo después de que lo leímos
+            Pago.objects.filter(id=pago.id).update(estado_pago_id=estado_pago_id(PAGO_RECHAZADO))
+            return original(modelo, campo, obj_id)
+
+        estados._nombre_por_id = leer_y_cambiar
+        try:
+            with self.assertRaises(ConflictoDeEstado):
+                transicionar_pago(pago.id, PAGO_APROBADO)
+        finally:
+            estados._nombre_por_id = original
+        self.assertEqual(nombre_estado(pago), PAGO_RECHAZADO)
+
+    def test_origenes(self):
+        self.assertEqual(estados.origenes(estados.TRANSICIONES_PAGO, PAGO_APROBADO), [PAGO_PENDIENTE])
+
+    def test_finalizar_pago_confirma_y_encola_correo_una_sola_vez(self):
+        reserva = crear_reserva(self.usuario)
+        pago = crear_pago(reserva)
+        finalizar_pago(pago.id)
+        finalizar_pago(pago.id) # Idempotente
+        self.assertEqual(nombre_estado(pago), PAGO_APROBADO)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CONFIRMADA)
+        self.assertEqual(Tarea.objects.filter(nombre='enviar_correo_confirmacion').count(), 1)
+
+
+class CacheEstadosTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+
+    def test_solo_consulta_la_primera_vez(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            primero = estado_pago_id(PAGO_APROBADO)
+        with self.assertNumQueries(0):
+            self.assertEqual(estado_pago_id(PAGO_APROBADO), primero)
+
+    def test_sin_crear_no_inserta_filas(self):
+        self.assertIsNone(estado_pago_id('Inexistente', crear=False))
+        self.assertFalse(EstadoPago.objects.filter(estado='Inexistente').exists())
+
+    def test_guardar_un_estado_limpia_la_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            estado_pago_id(PAGO_APROBADO)
+        EstadoPago.objects.create(estado='Nuevo')
+        self.assertEqual(estados._cache, {})
+
+
+class CacheEstadosRollbackTests(TransactionTestCase):
+    # Necesita commits reales: el id solo entra a la caché cuando la transacción confirma
+    serialized_rollback = True
+
+    def setUp(self):
+        estados.limpiar_cache()
+        self.usuario = crear_usuario()
+
+    def tearDown(self):
+        estados.limpiar_cache()
+
+    def test_rollback_no_deja_ids_inexistentes_en_cache(self):
+        # Base sin los estados sembrados: finalizar_pago los crea dentro de su transacción
+        EstadoPago.objects.filter(estado=PAGO_APROBADO).delete()
+        EstadoReserva.objects.filter(estado=RESERVA_CONFIRMADA).delete()
+        estados.limpiar_cache()
+
+        cancelada = crear_pago(crear_reserva(self.usuario, estado=RESERVA_CANCELADA))
+        with self.assertRaises(TransicionInvalida):
+            finalizar_pago(cancelada.id)
+        self.assertFalse(EstadoPago.objects.filter(estado=PAGO_APROBADO).exists())
+
+        # Antes esto fallaba con IntegrityError por el id de 'Aprobado' que quedó en caché
+        pendiente = crear_pago(crear_reserva(self.usuario))
+        finalizar_pago(pendiente.id)
+        self.assertEqual(nombre_estado(pendiente), PAGO_APROBADO)
+        self.assertEqual(nombre_estado(cancelada), PAGO_PENDIENTE)
+
+
+class ConciliarPagosTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.usuario = crear_usuario()
+
+    def conciliar(self, filas, *opciones):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('pago_id,monto,estado\n')
+            for fila in filas:
+                f.write(','.join(str(valor) for valor in fila) + '\n')
+        self.addCleanup(os.remove, f.name)
+        salida = StringIO()
+        call_command('conciliar_pagos', f.name, *opciones, stdout=salida)
+        return salida.getvalue()
+
+    def test_aprueba_confirma_y_encola_correo(self):
+        reserva = crear_reserva(self.usuario)
+        pago = crear_pago(reserva)
+        salida = self.conciliar([(pago.id, '100.00', 'aprobado')])
+        self.assertIn('actualizados_aprobado: 1', salida)
+        self.assertEqual(nombre_estado(pago), PAGO_APROBADO)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CONFIRMADA)
+        self.assertEqual(
+            list(Tarea.objects.filter(nombre='enviar_correo_confirmacion').values_list('argumentos', flat=True)),
+            [{'reserva_id': reserva.id}],
+        )
+
+    def test_reserva_cancelada_no_se_confirma_ni_recibe_correo(self):
+        reserva = crear_reserva(self.usuario, estado=RESERVA_CANCELADA)
+        pago = crear_pago(reserva)
+        self.conciliar([(pago.id, '100.00', 'approved')])
+        self.assertEqual(nombre_estado(pago), PAGO_APROBADO)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CANCELADA)
+        self.assertFalse(Tarea.objects.filter(nombre='enviar_correo_confirmacion').exists())
+
+    def test_rechazo_cancela_la_reserva(self):
+        reserva = crear_reserva(self.usuario)
+        pago = crear_pago(reserva)
+        self.conciliar([(pago.id, '100.00', 'rechazado')])
+        self.assertEqual(nombre_estado(pago), PAGO_RECHAZADO)
+        self.assertEqual(nombre_estado(reserva), RESERVA_CANCELADA)
+
+    def test_reporta_filas_problematicas(self):
+        pago = crear_pago(crear_reserva(self.usuario))
+        aprobado = crear_pago(crear_reserva(self.usuario), estado=PAGO_APROBADO)
+        salida = self.conciliar([
+            (pago.id, '99.00', 'aprobado'),
+            (999999, '10', 'aprobado'),
+            ('x', '10', 'aprobado'),
+            (pago.id, '100.00', 'raro'),
+            (aprobado.id, '100.00', 'aprobado'),
+        ])
+        for linea in ('monto_distinto: 1', 'no_encontrados: 1', 'filas_invalidas: 1',
+                      'estado_desconocido: 1', 'ya_conciliados: 1'):
+            self.assertIn(linea, salida)
+        self.assertEqual(nombre_estado(pago), PAGO_PENDIENTE)
+
+    def test_transicion_invalida_no_se_aplica(self):
+        pago = crear_pago(crear_reserva(self.usuario), estado=PAGO_RECHAZADO)
+        salida = self.conciliar([(pago.id, '100.00', 'aprobado')])
+        self.assertIn('transicion_invalida: 1', salida)
+        self.assertEqual(nombre_estado(pago), PAGO_RECHAZADO)
+
+    def test_simular_no_modifica_nada(self):
+        EstadoPago.objects.filter(estado=PAGO_REEMBOLSADO).delete()
+        reserva = crear_reserva(self.usuario)
+        pago = crear_pago(reserva)
+        estados_antes = EstadoPago.objects.count()
+        salida = self.conciliar([(pago.id, '100.00', 'aprobado')], '--simular')
+        self.assertIn('actualizados_aprobado: 1', salida)
+        self.assertEqual(nombre_estado(pago), PAGO_PENDIENTE)
+        self.assertEqual(nombre_estado(reserva), RESERVA_PENDIENTE)
+        self.assertEqual(EstadoPago.objects.count(), estados_antes)
+        self.assertFalse(Tarea.objects.exists())
+
+
+# --- Precios ---
+
+class PreciosTests(TestCase):
+    def setUp(self):
+        precios.limpiar_cache()
+        self.anfitrion = crear_usuario('anfitrion@manakea.cl')
+        self.tipo = TipoServicio.objects.create(nombre='Hospedaje')
+        # 100.00 por noche, +20% viernes y sábado
+        self.servicio = self.crear_servicio(precio=Decimal('100.00'), recargo=Decimal('20'))
+
+    def tearDown(self):
+        precios.limpiar_cache()
+
+    def crear_servicio(self, precio, recargo=Decimal('0'), cobro_por_noche=True, nombre='Cabaña'):
+        return Servicio.objects.create(
+            nombre=nombre, descripcion='', precio=precio, tipo_servicio=self.tipo, anfitrion=self.anfitrion,
+            recargo_fin_de_semana=recargo, cobro_por_noche=cobro_por_noche,
+        )
+
+    def calendario(self, desde, hasta, servicio=None):
+        servicio = servicio or self.servicio
+        return precios.calendario_precios([servicio.id], desde, hasta)[servicio.id]
+
+    def test_calendario_con_recargo_de_fin_de_semana(self):
+        # Del lunes 7 al domingo 13 de enero de 2030
+        self.assertEqual(
+            self.calendario(date(2030, 1, 7), date(2030, 1, 14)),
+            [10000, 10000, 10000, 10000, 12000, 12000, 10000],
+        )
+
+    def test_temporadas_con_y_sin_precio_de_fin_de_semana(self):
+        TarifaTemporada.objects.create(servicio=self.servicio, fecha_inicio=date(2030, 1, 9),
+                                       fecha_fin=date(2030, 1, 11), precio=Decimal('200.00'))
+        # La temporada que empieza después tiene prioridad y trae su propio precio de fin de semana
+        TarifaTemporada.objects.create(servicio=self.servicio, fecha_inicio=date(2030, 1, 11),
+                                       fecha_fin=date(2030, 1, 13), precio=Decimal('180.00'),
+                                       precio_fin_de_semana=Decimal('250.00'))
+        self.assertEqual(
+            self.calendario(date(2030, 1, 7), date(2030, 1, 15)),
+            [10000, 10000, 20000, 20000, 25000, 25000, 18000, 10000],
+        )
+
+    def test_estadia_que_cruza_el_anio(self):
+        TarifaTemporada.objects.create(servicio=self.servicio, fecha_inicio=date(2029, 12, 31),
+                                       fecha_fin=date(2030, 1, 1), precio=Decimal('300.00'))
+        # Viernes 28/12/2029 al sábado 5/1/2030: la porción se arma con dos calendarios anuales
+        self.assertEqual(
+            self.calendario(date(2029, 12, 28), date(2030, 1, 5)),
+            [12000, 12000, 10000, 30000, 30000, 10000, 10000, 12000],
+        )
+
+    def test_anio_bisiesto(self):
+        self.assertEqual(self.calendario(date(2028, 2, 28), date(2028, 3, 2)), [10000, 10000, 10000])
+        self.assertEqual(len(self.calendario(date(2028, 1, 1), date(2029, 1, 1))), 366)
+
+    def test_aplicar_porcentaje_redondea_half_up(self):
+        self.assertEqual(precios.aplicar_porcentaje(15, -1000), 14) # 13.5 -> 14
+        self.assertEqual(precios.aplicar_porcentaje(999, -1000), 899) # 899.1 -> 899
+        self.assertEqual(precios.aplicar_porcentaje(10000, 2000), 12000)
+        self.assertEqual(precios.aplicar_porcentaje(10000, -10000), 0)
+        self.assertEqual(precios.a_centavos(Decimal('33.33')), 3333)
+        self.assertEqual(precios.a_decimal(16623), Decimal('166.23'))
+
+    def test_cotizar_con_descuentos_por_noches_y_cantidad(self):
+        servicio = self.crear_servicio(precio=Decimal('33.33'), nombre='Tinaja')
+        Descuento.objects.create(servicio=servicio, tipo=Descuento.POR_NOCHES, minimo=3, porcentaje=Decimal('12.5'))
+        Descuento.objects.create(servicio=servicio, tipo=Descuento.POR_CANTIDAD, minimo=2, porcentaje=Decimal('5'))
+        # General y con mínimo menor: no aplica porque el del servicio (mínimo 2) tiene prioridad
+        Descuento.objects.create(tipo=Descuento.POR_CANTIDAD, minimo=1, porcentaje=Decimal('3'))
+
+        cotizacion = precios.cotizar([(servicio.id, 2)], date(2030, 1, 7), date(2030, 1, 10))
+        linea, = cotizacion.lineas
+        self.assertEqual(linea.precio_unitario, 8749) # 99.99 - 12.5% = 87.49125
+        self.assertEqual(linea.total, 16623) # 174.98 - 5% = 166.231
+        self.assertEqual(cotizacion.total_decimal, Decimal('166.23'))
+
+    def test_cobro_unico_usa_el_precio_del_primer_dia(self):
+        servicio = self.crear_servicio(precio=Decimal('50.00'), recargo=Decimal('20'), cobro_por_noche=False, nombre='Tour')
+        cotizacion = precios.cotizar([(servicio.id, 1)], date(2030, 1, 11), date(2030, 1, 13))
+        self.assertEqual(cotizacion.total, 6000)
+
+    def test_la_cache_se_invalida_al_cambiar_tarifas(self):
+        self.assertEqual(self.calendario(date(2030, 1, 7), date(2030, 1, 8)), [10000])
+        TarifaTemporada.objects.create(servicio=self.servicio, fecha_inicio=date(2030, 1, 1),
+                                       fecha_fin=date(2030, 1, 31), precio=Decimal('150.00'))
+        self.assertEqual(self.calendario(date(2030, 1, 7), date(2030, 1, 8)), [15000])
+
+    def test_fechas_invertidas(self):
+        with self.assertRaises(ValueError):
+            precios.cotizar([(self.servicio.id, 1)], date(2030, 1, 10), date(2030, 1, 7))
+
+    def test_porcentaje_de_descuento_entre_0_y_100(self):
+        with self.assertRaises(ValidationError):
+            Descuento(tipo=Descuento.POR_NOCHES, minimo=1, porcentaje=Decimal('150')).full_clean()
+        with self.assertRaises(IntegrityError):
+            Descuento.objects.create(tipo=Descuento.POR_NOCHES, minimo=1, porcentaje=Decimal('150'))
+
+
+    def test_recargo_y_precios_no_negativos(self):
+        with self.assertRaises(ValidationError):
+            Servicio(nombre='X', descripcion='-', precio=Decimal('10'), tipo_servicio=self.tipo, anfitrion=self.anfitrion,
+                     recargo_fin_de_semana=Decimal('-150')).full_clean()
+        with self.assertRaises(ValidationError):
+            TarifaTemporada(servicio=self.servicio, fecha_inicio=date(2030, 1, 1), fecha_fin=date(2030, 1, 2),
+                            precio=Decimal('10'), precio_fin_de_semana=Decimal('-1')).full_clean()
+        for crear in (
+            lambda: self.crear_servicio(precio=Decimal('100.00'), recargo=Decimal('-150'), nombre='Negativo'),
+            lambda: self.crear_servicio(precio=Decimal('-1.00'), nombre='Gratis'),
+            lambda: TarifaTemporada.objects.create(servicio=self.servicio, fecha_inicio=date(2030, 1, 1),
+                                                   fecha_fin=date(2030, 1, 2), precio=Decimal('-10')),
+            lambda: TarifaTemporada.objects.create(servicio=self.servicio, fecha_inicio=date(2030, 1, 1),
+                                                   fecha_fin=date(2030, 1, 2), precio=Decimal('10'),
+                                                   precio_fin_de_semana=Decimal('-10')),
+        ):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                crear()
+
+    def test_temporada_con_fechas_invertidas(self):
+        tarifa = TarifaTemporada(servicio=self.servicio, fecha_inicio=date(2030, 1, 10),
+                                 fecha_fin=date(2030, 1, 5), precio=Decimal('10'))
+        with self.assertRaises(ValidationError) as error:
+            tarifa.full_clean()
+        self.assertIn('fecha_fin', error.exception.message_dict)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            tarifa.save()
+
+
+# --- API con ETags ---
+
+class ApiEtagTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.anfitrion = crear_usuario('anfitrion@manakea.cl')
+        self.cliente = crear_usuario()
+        tipo = TipoServicio.objects.create(nombre='Hospedaje')
+        Servicio.objects.create(nombre='Cabaña', descripcion='', precio=Decimal('100.00'),
+                                tipo_servicio=tipo, anfitrion=self.anfitrion)
+        self.client.force_login(self.cliente)
+
+    def assertCambiaEtag(self, url, cambio):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cambio()
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_renombrar_anfitrion_invalida_el_catalogo(self):
+        def renombrar():
+            self.anfitrion.nombre = 'Beatriz'
+            self.anfitrion.save()
+        datos = self.assertCambiaEtag('/api/servicios/', renombrar)
+        self.assertEqual(datos['resultados'][0]['anfitrion'], 'Beatriz')
+
+    def test_login_no_invalida_el_catalogo(self):
+        url = '/api/servicios/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.anfitrion) # Guarda solo last_login
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_renombrar_estado_invalida_el_historial(self):
+        crear_reserva(self.cliente)
+
+        def renombrar():
+            EstadoReserva.objects.filter(estado=RESERVA_PENDIENTE).get().save()
+        self.assertCambiaEtag('/api/reservas/', renombrar)
+
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.anfitrion = crear_usuario('anfitrion@manakea.cl')
+        self.cliente = crear_usuario()
+        tipo = TipoServicio.objects.create(nombre='Hospedaje')
+        self.servicios = [
+            Servicio.objects.create(nombre=f'Cabaña {i}', descripcion='', precio=Decimal('100.00'),
+                                    tipo_servicio=tipo, anfitrion=self.anfitrion)
+            for i in range(3)
+        ]
+        self.client.force_login(self.cliente)
+
+    def test_seleccion_de_campos(self):
+        datos = self.client.get('/api/servicios/?campos=nombre,tipo_servicio').json()
+        self.assertEqual(datos['resultados'][0], {'nombre': 'Cabaña 0', 'tipo_servicio': 'Hospedaje'})
+        respuesta = self.client.get('/api/servicios/?campos=nombre,clave')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('clave', respuesta.json()['error'])
+
+    def test_paginacion_por_cursor(self):
+        primera = self.client.get('/api/servicios/?campos=id&limite=2').json()
+        self.assertEqual([r['id'] for r in primera['resultados']], [s.id for s in self.servicios[:2]])
+        self.assertEqual(primera['siguiente'], str(self.servicios[1].id))
+        segunda = self.client.get(f"/api/servicios/?campos=id&limite=2&cursor={primera['siguiente']}").json()
+        self.assertEqual(segunda, {'resultados': [{'id': self.servicios[2].id}], 'siguiente': None})
+        self.assertEqual(self.client.get('/api/servicios/?cursor=abc').status_code, 400)
+
+    def test_sin_sesion_responde_401(self):
+        self.client.logout()
+        for url in ('/api/carrito/', '/api/reservas/'):
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 401)
+            self.assertIn('error', respuesta.json())
+
+    def test_servicio_inexistente_responde_404(self):
+        self.assertEqual(self.client.get(f'/api/servicios/{self.servicios[0].id}/').json()['nombre'], 'Cabaña 0')
+        self.assertEqual(self.client.get('/api/servicios/999999/').status_code, 404)
+
+    def test_reservas_con_detalles(self):
+        antigua, reciente = crear_reserva(self.cliente), crear_reserva(self.cliente)
+        crear_reserva(self.anfitrion) # De otro usuario: no aparece
+        DetalleReserva.objects.create(reserva=reciente, servicio=self.servicios[1], cantidad=2, precio_unitario=Decimal('90.00'))
+        datos = self.client.get('/api/reservas/?campos=id,estado,detalles').json()
+        self.assertEqual([r['id'] for r in datos['resultados']], [reciente.id, antigua.id]) # Más reciente primero
+        self.assertEqual(datos['resultados'][0]['estado'], RESERVA_PENDIENTE)
+        self.assertEqual(datos['resultados'][0]['detalles'], [
+            {'servicio_id': self.servicios[1].id, 'servicio': 'Cabaña 1', 'cantidad': 2, 'precio_unitario': '90.00'},
+        ])
+        self.assertEqual(datos['resultados'][1]['detalles'], [])
+        self.assertNotIn('detalles', self.client.get('/api/reservas/?campos=id').json()['resultados'][0])
+
+
+
+# --- Réplicas de lectura ---
+
+@override_settings(REPLICAS=['replica_pruebas'])
+class RouterReplicasTests(TransactionTestCase):
+    # Sin la transacción envolvente de TestCase, que mandaría toda lectura a la primaria.
+    # 'replica_pruebas' es un espejo de 'default' (ver manakear/settings.py)
+    databases = {'default', 'replica_pruebas'}
+    serialized_rollback = True
+
+    def setUp(self):
+        estados.limpiar_cache()
+        self.router = RouterReplicas()
+        self.usuario = crear_usuario()
+        # Cada prueba parte como una petición nueva, sin escrituras previas
+        token = router._hubo_escritura.set(False)
+        self.addCleanup(router._hubo_escritura.reset, token)
+
+    def test_lecturas_van_a_la_replica_solo_dentro_de_en_replica(self):
+        self.assertIsNone(self.router.db_for_read(Usuario))
+        self.assertEqual(Usuario.objects.all().db, 'default')
+        with en_replica():
+            self.assertEqual(self.router.db_for_read(Usuario), 'replica_pruebas')
+            usuarios = list(Usuario.objects.all())
+        self.assertEqual([u._state.db for u in usuarios], ['replica_pruebas'])
+        with override_settings(REPLICAS=[]), en_replica():
+            self.assertIsNone(self.router.db_for_read(Usuario))
+
+    def test_una_sola_replica_por_peticion(self):
+        with override_settings(REPLICAS=['replica_a', 'replica_b']):
+            with mock.patch('core.router.random.choice', side_effect=['replica_b', 'replica_a']) as elegir:
+                with en_replica():
+                    elegidas = {self.router.db_for_read(Usuario) for _ in range(5)}
+                    with en_replica():
+                        elegidas.add(self.router.db_for_read(Usuario))
+        self.assertEqual(elegidas, {'replica_b'})
+        self.assertEqual(elegir.call_count, 1)
+
+    def test_en_transaccion_lee_de_la_primaria(self):
+        with en_replica(), transaction.atomic():
+            self.assertIsNone(self.router.db_for_read(Usuario))
+
+    def test_escrituras_siempre_a_default_y_luego_se_lee_de_ahi(self):
+        with en_replica():
+            self.assertEqual(self.router.db_for_write(Usuario), 'default')
+            tipo = TipoServicio.objects.create(nombre='Hospedaje')
+            self.assertEqual(tipo._state.db, 'default')
+            # Ya se escribió en esta petición: la lectura siguiente no puede ir a una réplica atrasada
+            self.assertIsNone(self.router.db_for_read(Usuario))
+
+    def atender(self, request, escribir=False):
+        decisiones = []
+
+        def vista(request):
+            with en_replica():
+                decisiones.append(self.router.db_for_read(Usuario))
+                if escribir:
+                    self.router.db_for_write(Usuario)
+                    decisiones.append(self.router.db_for_read(Usuario))
+            return HttpResponse()
+        ReplicaMiddleware(vista)(request)
+        return decisiones
+
+    def test_la_sesion_queda_fijada_a_la_primaria_tras_escribir(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        self.assertEqual(self.atender(request, escribir=True), ['replica_pruebas', None])
+        self.assertGreater(request.session[SESION_FIJAR_PRIMARIA], time.time())
+        self.assertEqual(self.atender(request), [None]) # Fijada: lee lo que escribió
+        request.session[SESION_FIJAR_PRIMARIA] = time.time() - 1
+        self.assertEqual(self.atender(request), ['replica_pruebas']) # Venció el plazo
+
+    def test_login_fija_la_sesion(self):
+        self.client.post('/login/', {'correo': self.usuario.correo, 'password': 'clave-segura'})
+        self.assertGreater(self.client.session[SESION_FIJAR_PRIMARIA], time.time())
+
+
+# --- Retención ---
+
+class ArchivarReservasTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.usuario = crear_usuario()
+
+    def crear_reserva_vieja(self):
+        return Reserva.objects.create(usuario=self.usuario, fecha_inicio=date(2020, 1, 1),
+                                      fecha_fin=date(2020, 1, 3), total=Decimal('50.00'))
+
+    def test_mueve_reserva_y_pago_al_archivo(self):
+        reserva = self.crear_reserva_vieja()
+        crear_pago(reserva)
+        self.assertEqual(retencion.archivar_reservas(dias=30, pausa=0), 1)
+        self.assertFalse(Reserva.objects.filter(id=reserva.id).exists())
+        self.assertTrue(ReservaArchivada.objects.filter(id=reserva.id, total=Decimal('50.00')).exists())
+        self.assertTrue(PagoArchivado.objects.filter(reserva_id=reserva.id).exists())
+
+    def test_conflicto_con_el_archivo_no_borra_la_reserva(self):
+        reserva = self.crear_reserva_vieja()
+        ReservaArchivada.objects.create(id=reserva.id, usuario=self.usuario, fecha_reserva=reserva.fecha_reserva,
+                                        fecha_inicio=date(2019, 1, 1), fecha_fin=date(2019, 1, 2), total=Decimal('1.00'))
+        with self.assertRaises(IntegrityError):
+            retencion.archivar_reservas(dias=30, pausa=0)
+        self.assertTrue(Reserva.objects.filter(id=reserva.id).exists())
+
+
+    def test_historial_archivado_en_perfil_solo_a_pedido(self):
+        self.usuario.tipo_usuario = TipoUsuario.objects.create(tipo_nombre='cliente')
+        self.usuario.save()
+        tipo = TipoServicio.objects.create(nombre='Actividad')
+        servicio = Servicio.objects.create(nombre='Kayak', descripcion='', precio=Decimal('20.00'),
+                                           tipo_servicio=tipo, anfitrion=self.usuario)
+        reserva = self.crear_reserva_vieja()
+        DetalleReserva.objects.create(reserva=reserva, servicio=servicio, precio_unitario=Decimal('20.00'))
+        retencion.archivar_reservas(dias=30, pausa=0)
+        servicio.delete() # El archivo guarda los nombres, no depende del servicio
+
+        historial, = retencion.historial_archivado(self.usuario)
+        self.assertEqual((historial['id'], historial['nombre_servicio'], historial['tipo_servicio']),
+                         (reserva.id, 'Kayak', 'Actividad'))
+        self.assertTrue(historial['archivada'])
+
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get('/perfil/').context['reservas'], [])
+        respuesta = self.client.get('/perfil/?historial=1')
+        self.assertEqual([r['id'] for r in respuesta.context['reservas']], [reserva.id])
+
+
+class CarritosRetencionTests(TestCase):
+    def setUp(self):
+        self.usuario = crear_usuario()
+        tipo = TipoServicio.objects.create(nombre='Hospedaje')
+        self.servicio = Servicio.objects.create(nombre='Cabaña', descripcion='', precio=Decimal('100.00'),
+                                                tipo_servicio=tipo, anfitrion=self.usuario)
+
+    def crear_carrito(self, dias_inactivo, activo=True):
+        carrito = Carrito.objects.create(usuario=self.usuario, activo=activo)
+        DetalleCarrito.objects.create(carrito=carrito, servicio=self.servicio)
+        Carrito.objects.filter(id=carrito.id).update(fecha_actualizacion=timezone.now() - timedelta(days=dias_inactivo))
+        return carrito
+
+    def actividad_durante_el_lote(self, carrito):
+        # Simula que el usuario toca el carrito entre la lectura de ids y el UPDATE/DELETE del lote
+        por_lotes = retencion._por_lotes
+
+        def con_actividad(*args, **kwargs):
+            for ids in por_lotes(*args, **kwargs):
+                Carrito.objects.filter(id=carrito.id).update(fecha_actualizacion=timezone.now())
+                yield ids
+        return mock.patch.object(retencion, '_por_lotes', con_actividad)
+
+    def test_abandonar_carritos_inactivos(self):
+        viejo, reciente = self.crear_carrito(40), self.crear_carrito(5)
+        self.assertEqual(retencion.abandonar_carritos(dias=30, pausa=0), 1)
+        viejo.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual((viejo.activo, reciente.activo), (False, True))
+
+    def test_abandonar_revisa_la_actividad_dentro_del_lote(self):
+        carrito = self.crear_carrito(40)
+        with self.actividad_durante_el_lote(carrito):
+            self.assertEqual(retencion.abandonar_carritos(dias=30, pausa=0), 0)
+        carrito.refresh_from_db()
+        self.assertTrue(carrito.activo)
+
+    def test_purgar_borra_solo_inactivos_viejos_con_sus_items(self):
+        viejo = self.crear_carrito(100, activo=False)
+        activo_viejo = self.crear_carrito(100)
+        inactivo_reciente = self.crear_carrito(10, activo=False)
+        self.assertEqual(retencion.purgar_carritos(dias=90, pausa=0), 1)
+        self.assertEqual(set(Carrito.objects.values_list('id', flat=True)), {activo_viejo.id, inactivo_reciente.id})
+        self.assertFalse(DetalleCarrito.objects.filter(carrito_id=viejo.id).exists())
+
+    def test_purgar_revisa_el_plazo_dentro_del_lote(self):
+        carrito = self.crear_carrito(100, activo=False)
+        with self.actividad_durante_el_lote(carrito):
+            self.assertEqual(retencion.purgar_carritos(dias=90, pausa=0), 0)
+        self.assertTrue(Carrito.objects.filter(id=carrito.id).exists())
+
+    def test_quitar_un_item_cuenta_como_actividad(self):
+        carrito = self.crear_carrito(40)
+        DetalleCarrito.objects.filter(carrito=carrito).get().delete()
+        carrito.refresh_from_db()
+        self.assertGreater(carrito.fecha_actualizacion, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(retencion.abandonar_carritos(dias=30, pausa=0), 0)
+
+
+# --- Contadores desnormalizados ---
+
+class ContadoresTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.usuario = crear_usuario()
+        tipo = TipoServicio.objects.create(nombre='Hospedaje')
+        self.servicio = Servicio.objects.create(nombre='Cabaña', descripcion='', precio=Decimal('100.00'),
+                                                tipo_servicio=tipo, anfitrion=self.usuario)
+        self.reserva = crear_reserva(self.usuario, total=Decimal('250.00'))
+        self.detalle = DetalleReserva.objects.create(reserva=self.reserva, servicio=self.servicio,
+                                                     cantidad=2, precio_unitario=Decimal('125.00'))
+
+    def verificar(self, *opciones):
+        salida = StringIO()
+        call_command('verificar_contadores', *opciones, stdout=salida)
+        return salida.getvalue()
+
+    def test_senales_mantienen_los_contadores(self):
+        self.servicio.refresh_from_db()
+        self.reserva.refresh_from_db()
+        self.assertEqual((self.servicio.veces_reservado, self.servicio.ingresos), (1, Decimal('250.00')))
+        self.assertEqual((self.reserva.cantidad_items, self.reserva.total_calculado), (1, Decimal('250.00')))
+        self.detalle.delete()
+        self.servicio.refresh_from_db()
+        self.assertEqual((self.servicio.veces_reservado, self.servicio.ingresos), (0, Decimal('0.00')))
+
+    def test_reparar_corrige_solo_lo_desfasado(self):
+        Servicio.objects.filter(id=self.servicio.id).update(veces_reservado=9)
+        salida = self.verificar()
+        self.assertIn('Servicio.veces_reservado: 1 filas desfasadas', salida)
+        self.servicio.refresh_from_db()
+        self.assertEqual(self.servicio.veces_reservado, 9) # Sin --reparar no cambia nada
+
+        self.verificar('--reparar')
+        self.servicio.refresh_from_db()
+        self.assertEqual((self.servicio.veces_reservado, self.servicio.ingresos), (1, Decimal('250.00')))
+        self.assertIn('Todos los contadores están al día.', self.verificar())
+
+
+# --- Recomendaciones ---
+
+class RecomendacionesTests(TestCase):
+    def setUp(self):
+        estados.limpiar_cache()
+        self.usuario = crear_usuario()
+        tipo = TipoServicio.objects.create(nombre='Actividad')
+        self.servicios = [
+            Servicio.objects.create(nombre=f'Servicio {i}', descripcion='', precio=Decimal('10.00'),
+                                    tipo_servicio=tipo, anfitrion=self.usuario)
+            for i in range(4)
+        ]
+
+    def reservar(self, *indices, reserva=None):
+        reserva = reserva or crear_reserva(self.usuario)
+        for i in indices:
+            DetalleReserva.objects.create(reserva=reserva, servicio=self.servicios[i], precio_unitario=Decimal('10.00'))
+        return reserva
+
+    def matriz(self):
+        return set(CoocurrenciaServicio.objects.values_list('servicio_id', 'otro_id', 'veces'))
+
+    def test_detalle_nuevo_queda_pendiente_y_encola_una_sola_tarea(self):
+        self.reservar(0, 1)
+        self.reservar(1, 2)
+        self.assertEqual(DetallePendienteRecomendacion.objects.count(), 4)
+        self.assertEqual(Tarea.objects.filter(nombre='actualizar_recomendaciones', estado=Tarea.PENDIENTE).count(), 1)
+
+    def test_actualizar_coincide_con_reconstruir(self):
+        reserva = self.reservar(0, 1)
+        self.reservar(1, 2, 3)
+        self.assertEqual(recomendaciones.actualizar(lote=2), 5)
+        self.reservar(2, reserva=reserva) # Un servicio más en una reserva ya indexada
+        self.assertEqual(recomendaciones.actualizar(), 1)
+        incremental = self.matriz()
+        recomendaciones.reconstruir()
+        self.assertEqual(self.matriz(), incremental)
+        self.assertFalse(DetallePendienteRecomendacion.objects.exists())
+
+    def test_detalle_con_id_menor_confirmado_tarde_se_cuenta(self):
+        # En PostgreSQL el id se asigna antes del commit: un detalle puede aparecer después que otros con id mayor
+        primera, tardia = crear_reserva(self.usuario), crear_reserva(self.usuario)
+        for detalle_id, i in ((10, 0), (11, 1)):
+            DetalleReserva.objects.create(id=detalle_id, reserva=primera, servicio=self.servicios[i], precio_unitario=Decimal('10.00'))
+        recomendaciones.actualizar()
+        for detalle_id, i in ((1, 0), (2, 1)):
+            DetalleReserva.objects.create(id=detalle_id, reserva=tardia, servicio=self.servicios[i], precio_unitario=Decimal('10.00'))
+        self.assertEqual(recomendaciones.actualizar(), 2)
+        self.assertIn((self.servicios[0].id, self.servicios[1].id, 2), self.matriz())
+
+
+# --- Importación de servicios ---
+
+class ImportarServiciosTests(TestCase):
+    def setUp(self):
+        self.anfitrion = crear_usuario('anfitrion@manakea.cl')
+        self.anfitrion.tipo_usuario = TipoUsuario.objects.create(tipo_nombre='anfitrion')
+        self.anfitrion.save()
+        TipoServicio.objects.create(nombre='Hospedaje')
+
+    def importar(self, *lineas):
+        return importar_servicios(StringIO('\n'.join(lineas)), self.anfitrion, miniaturas=False)
+
+    def test_vista_solo_para_anfitriones(self):
+        self.client.force_login(crear_usuario())
+        self.assertEqual(self.client.get('/importar_servicios').status_code, 403)
+        self.client.force_login(self.anfitrion)
+        self.assertEqual(self.client.get('/importar_servicios').status_code, 200)
+
+    def test_rechaza_rutas_de_imagen_fuera_de_media(self):
+        resultado = self.importar(
+            'nombre,descripcion,precio,tipo_servicio,imagen',
+            'Absoluta,,10,hospedaje,/etc/passwd',
+            'Subida,,10,hospedaje,servicios/../../settings.py',
+            'Larga,,10,hospedaje,servicios/' + 'a' * 100 + '.jpg',
+            'Valida,,10,hospedaje,servicios/cabana.jpg',
+        )
+        self.assertEqual([fila for fila, _ in resultado.errores], [2, 3, 4])
+        self.assertEqual(list(Servicio.objects.values_list('nombre', 'imagen')), [('Valida', 'servicios/cabana.jpg')])
+
+    def test_columnas_opcionales_ausentes_no_se_sobrescriben(self):
+        self.importar('nombre,descripcion,precio,tipo_servicio,cobro_por_noche,recargo_fin_de_semana,imagen',
+                      'Cabaña,Vieja,10,Hospedaje,no,15,servicios/cabana.jpg')
+        resultado = self.importar('nombre,descripcion,precio,tipo_servicio', 'Cabaña,Nueva,20,Hospedaje')
+        self.assertEqual((resultado.creados, resultado.actualizados), (0, 1))
+        servicio = Servicio.objects.get(nombre='Cabaña')
+        self.assertEqual((servicio.descripcion, servicio.precio), ('Nueva', Decimal('20.00')))
+        self.assertEqual((servicio.cobro_por_noche, servicio.recargo_fin_de_semana, servicio.imagen.name),
+                         (False, Decimal('15.00'), 'servicios/cabana.jpg'))
+
+
+    def test_recargo_negativo_es_error_de_la_fila(self):
+        resultado = self.importar(
+            'nombre,descripcion,precio,tipo_servicio,recargo_fin_de_semana',
+            'Negativo,,10,Hospedaje,-500',
+            'Precio negativo,,-1,Hospedaje,',
+            'Bien,,10,Hospedaje,15',
+        )
+        self.assertEqual([fila for fila, _ in resultado.errores], [2, 3])
+        self.assertIn('recargo_fin_de_semana', resultado.errores[0][1])
+        self.assertEqual(list(Servicio.objects.values_list('nombre', flat=True)), ['Bien'])
+
+    def subir(self, contenido):
+        self.client.force_login(self.anfitrion)
+        return self.client.post('/importar_servicios', {'archivo': SimpleUploadedFile('servicios.csv', contenido)})
+
+    def test_vista_guarda_lo_leido_antes_de_un_error_de_codificacion(self):
+        # Más grande que el búfer de lectura, para que el byte inválido aparezca a mitad del archivo
+        filas = [f'Servicio {i},,10,Hospedaje,servicios/{i}.jpg'.encode() for i in range(1000)]
+        contenido = b'\n'.join([b'nombre,descripcion,precio,tipo_servicio,imagen', *filas, b'Caf\xe9,,10,Hospedaje,'])
+        with mock.patch('core.importacion.LOTE', 100):
+            respuesta = self.subir(contenido)
+        self.assertEqual(respuesta.status_code, 200)
+        resultado = respuesta.context['resultado']
+        fila_error, mensaje = resultado.errores[-1]
+        self.assertIn('No se pudo leer', mensaje)
+        self.assertGreater(resultado.creados, 100) # Lotes ya confirmados antes del error
+        self.assertEqual(fila_error, resultado.creados + 2) # Todo lo leído antes de la fila del error se guardó
+        self.assertEqual(Servicio.objects.count(), resultado.creados)
+        # Se encolan las miniaturas de lo que sí se guardó
+        encoladas = Tarea.objects.filter(nombre='generar_miniaturas').values_list('argumentos', flat=True)
+        self.assertEqual(sorted(i for argumentos in encoladas for i in argumentos['servicio_ids']),
+                         sorted(Servicio.objects.values_list('id', flat=True)))
+
+    def test_vista_informa_csv_mal_formado_sin_error_500(self):
+        limite = csv.field_size_limit()
+        self.addCleanup(csv.field_size_limit, limite)
+        csv.field_size_limit(100)
+        respuesta = self.subir(b'nombre,descripcion,precio,tipo_servicio\nCorta,,10,Hospedaje\nLarga,' + b'x' * 200 + b',10,Hospedaje\n')
+        self.assertEqual(respuesta.status_code, 200)
+        resultado = respuesta.context['resultado']
+        self.assertEqual((resultado.creados, resultado.errores[0][0]), (1, 3))
+
+    def test_vista_rechaza_encabezado_ilegible(self):
+        respuesta = self.subir(b'\xff\xfenombre')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('archivo', respuesta.context['form'].errors)
+        self.assertFalse(Servicio.objects.exists())
+
+
+# --- Cola de tareas ---
+
+EJECUTADAS = []
+
+
+@tarea(nombre='prueba_registrar')
+def prueba_registrar(valor):
+    EJECUTADAS.append(valor)
+
+
+@tarea(nombre='prueba_fallar', max_intentos=2)
+def prueba_fallar():
+    raise RuntimeError('proveedor caído')
+
+
+@tarea(nombre='prueba_periodica', cada=timedelta(hours=1))
+def prueba_periodica():
+    EJECUTADAS.append('periodica')
+
+
+class ColaTests(TestCase):
+    def setUp(self):
+        EJECUTADAS.clear()
+
+    def test_reclama_con_update_condicional(self):
+        prueba_registrar.encolar(valor=1)
+        prueba_registrar.encolar(valor=2)
+        prueba_registrar.encolar(valor=3, ejecutar_en=timezone.now() + timedelta(hours=1))
+        reclamadas = cola.reclamar_tareas(limite=10)
+        self.assertEqual([t.argumentos['valor'] for t in reclamadas], [1, 2])
+        self.assertTrue(all(t.estado == Tarea.EN_PROCESO and t.intentos == 1 and t.bloqueada_en for t in reclamadas))
+        self.assertEqual(cola.reclamar_tareas(limite=10), []) # Ya no quedan listas
+
+    def test_reclama_con_skip_locked(self):
+        prueba_registrar.encolar(valor=1)
+        prueba_registrar.encolar(valor=2)
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True):
+            self.assertEqual(len(cola.reclamar_tareas(limite=1)), 1)
+            self.assertEqual(len(cola.reclamar_tareas(limite=10)), 1)
+            self.assertEqual(cola.reclamar_tareas(limite=10), [])
+
+    def test_encolar_respeta_la_transaccion(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            prueba_registrar.encolar(valor=1)
+            raise RuntimeError
+        self.assertFalse(Tarea.objects.exists())
+        with self.assertRaises(ValueError):
+            cola.encolar('no_existe')
+
+    def test_reintenta_con_backoff_y_luego_falla(self):
+        tarea_obj = prueba_fallar.encolar()
+        with self.assertLogs('core.cola', 'ERROR'):
+            self.assertFalse(cola.ejecutar_tarea(cola.reclamar_tareas()[0]))
+        tarea_obj.refresh_from_db()
+        self.assertEqual((tarea_obj.estado, tarea_obj.intentos), (Tarea.PENDIENTE, 1))
+        self.assertIn('proveedor caído', tarea_obj.ultimo_error)
+        self.assertGreater(tarea_obj.ejecutar_despues, timezone.now() + timedelta(seconds=cola.RETRASO_BASE - 1))
+        self.assertEqual(cola.reclamar_tareas(), []) # Aún no toca reintentar
+
+        Tarea.objects.filter(id=tarea_obj.id).update(ejecutar_despues=timezone.now())
+        with self.assertLogs('core.cola', 'ERROR'):
+            cola.ejecutar_tarea(cola.reclamar_tareas()[0])
+        tarea_obj.refresh_from_db()
+        self.assertEqual((tarea_obj.estado, tarea_obj.intentos), (Tarea.FALLIDA, 2))
+        self.assertIsNotNone(tarea_obj.fecha_fin)
+
+    def test_calcular_retraso_crece_y_tiene_tope(self):
+        self.assertLess(cola.calcular_retraso(1), cola.calcular_retraso(4))
+        self.assertLessEqual(cola.calcular_retraso(50), timedelta(seconds=cola.RETRASO_MAXIMO * 1.1))
+
+    def test_ejecucion_lenta_no_pisa_a_la_que_la_reclamo_de_nuevo(self):
+        tarea_obj = prueba_registrar.encolar(valor=1)
+        lenta = cola.reclamar_tareas()[0]
+        Tarea.objects.filter(id=tarea_obj.id).update(bloqueada_en=timezone.now() - cola.TIEMPO_BLOQUEO * 2)
+        self.assertEqual(cola.liberar_tareas_abandonadas(), 1)
+        nueva = cola.reclamar_tareas()[0]
+
+        with self.assertLogs('core.cola', 'WARNING'):
+            self.assertFalse(cola.ejecutar_tarea(lenta))
+        tarea_obj.refresh_from_db()
+        self.assertEqual((tarea_obj.estado, tarea_obj.intentos), (Tarea.EN_PROCESO, 2))
+        self.assertTrue(cola.ejecutar_tarea(nueva))
+        tarea_obj.refresh_from_db()
+        self.assertEqual(tarea_obj.estado, Tarea.COMPLETADA)
+
+    def test_liberar_no_toca_tareas_recientes(self):
+        prueba_registrar.encolar(valor=1)
+        cola.reclamar_tareas()
+        self.assertEqual(cola.liberar_tareas_abandonadas(), 0)
+
+    def test_tarea_periodica_se_programa_una_sola_vez(self):
+        self.assertGreater(cola.programar_periodicas(), 0)
+        self.assertEqual(cola.programar_periodicas(), 0)
+        periodica = Tarea.objects.get(nombre='prueba_periodica')
+        periodica.refresh_from_db()
+        cola.ejecutar_tarea(next(t for t in cola.reclamar_tareas(limite=100) if t.id == periodica.id))
+        siguiente = Tarea.objects.get(nombre='prueba_periodica', estado=Tarea.PENDIENTE)
+        self.assertGreater(siguiente.ejecutar_despues, timezone.now() + timedelta(minutes=59))
+        self.assertEqual(EJECUTADAS, ['periodica'])
+
+    def test_limpiar_tareas_usa_la_fecha_de_termino(self):
+        ahora = timezone.now()
+        viejas = dict(ejecutar_despues=ahora) # La fecha programada no importa
+        borrar = [
+            Tarea.objects.create(nombre='x', estado=Tarea.COMPLETADA, fecha_fin=ahora - timedelta(days=8), **viejas),
+            Tarea.objects.create(nombre='x', estado=Tarea.FALLIDA, fecha_fin=ahora - timedelta(days=31), **viejas),
+        ]
+        conservar = [
+            Tarea.objects.create(nombre='x', estado=Tarea.COMPLETADA, fecha_fin=ahora - timedelta(days=1), **viejas),
+            Tarea.objects.create(nombre='x', estado=Tarea.FALLIDA, fecha_fin=ahora - timedelta(days=8), **viejas),
+            Tarea.objects.create(nombre='x', estado=Tarea.PENDIENTE, ejecutar_despues=ahora - timedelta(days=60)),
+        ]
+        limpiar_tareas()
+        self.assertEqual(set(Tarea.objects.values_list('id', flat=True)), {t.id for t in conservar})
+        self.assertFalse(Tarea.objects.filter(id__in=[t.id for t in borrar]).exists())
+
+
+class ProcesarTareasTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        EJECUTADAS.clear()
+        estados.limpiar_cache()
+
+    def test_una_vez_vacia_la_cola_y_recupera_abandonadas(self):
+        for valor in range(5):
+            prueba_registrar.encolar(valor=valor)
+        abandonada = prueba_registrar.encolar(valor=99)
+        Tarea.objects.filter(id=abandonada.id).update(
+            estado=Tarea.EN_PROCESO, intentos=1, bloqueada_en=timezone.now() - cola.TIEMPO_BLOQUEO * 2,
+        )
+        salida = StringIO()
+        # Un solo hilo: la base SQLite en memoria de las pruebas bloquea tablas enteras entre conexiones
+        call_command('procesar_tareas', '--una-vez', '--hilos', '1', '--lote', '2', stdout=salida)
+
+        self.assertIn('Se liberaron 1 tareas abandonadas.', salida.getvalue())
+        self.assertEqual(sorted(EJECUTADAS, key=str), sorted([0, 1, 2, 3, 4, 99, 'periodica'], key=str))
+        self.assertFalse(Tarea.objects.filter(nombre='prueba_registrar').exclude(estado=Tarea.COMPLETADA).exists())
+        # Las periódicas quedan programadas para su próxima ejecución
+        self.assertTrue(Tarea.objects.filter(nombre='aplicar_retencion', estado=Tarea.PENDIENTE).exists())
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views # Importa tus vistas desde el mismo directorio
+from . import api, views # Importa tus vistas desde el mismo directorio
 
 urlpatterns = [
     path('', views.inicio, name='inicio'),
@@ -13,5 +13,12 @@ urlpatterns = [
     path('inicioregistrado/', views.inicioregistrado, name='inicioregistrado'),
     path('perfil/', views.perfil, name='perfil'),
     path('listar_servicios_anfitrion', views.listar_servicios_anfitrion, name='listar_servicios_anfitrion'),
-    path('listar_reservas_anfitrion', views.listar_reservas_anfitrion, name='listar_reservas_anfitrion')
+    path('listar_reservas_anfitrion', views.listar_reservas_anfitrion, name='listar_reservas_anfitrion'),
+    path('importar_servicios', views.importar_servicios, name='importar_servicios'),
+
+    # API JSON (cliente móvil)
+    path('api/servicios/', api.servicios, name='api_servicios'),
+    path('api/servicios/<int:servicio_id>/', api.servicio, name='api_servicio'),
+    path('api/carrito/', api.carrito, name='api_carrito'),
+    path('api/reservas/', api.reservas, name='api_reservas'),
 ]
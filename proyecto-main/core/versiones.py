@@ -0,0 +1,143 @@
+# core/versiones.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+from .models import (
+    Carrito, DetalleCarrito, DetalleReserva, EstadoReserva, Reserva, Servicio, TipoServicio, Usuario, VersionRecurso,
+)
+
+# Claves de los recursos versionados
+SERVICIOS = 'servicios'
+ESTADOS_RESERVA = 'estados_reserva' # Nombres de EstadoReserva que muestra el historial
+
+# Claves pendientes mientras hay un bloque agrupar() activo
+_pendientes = ContextVar('versiones_pendientes', default=None)
+_silenciar_senales = ContextVar('versiones_silenciar_senales', default=False)
+
+
+def clave_carrito(usuario_id):
+    return f'carrito:{usuario_id}'
+
+
+def clave_reservas(usuario_id):
+    return f'reservas:{usuario_id}'
+
+
+def obtener_version(clave):
+    """
+    Versión actual del recurso (0 si nunca cambió).
+    """
+    return VersionRecurso.objects.filter(clave=clave).values_list('version', flat=True).first() or 0
+
+
+def obtener_versiones(*claves):
+    """
+    Versión de cada clave, en el mismo orden, con una sola consulta.
+    """
+    versiones = dict(VersionRecurso.objects.filter(clave__in=claves).values_list('clave', 'version'))
+    return [versiones.get(clave, 0) for clave in claves]
+
+
+def incrementar(*claves):
+    """
+    Incrementa la versión de cada recurso con un UPDATE atómico (F('version') + 1).
+    Se llama dentro de la misma transacción que la escritura, así que si esta hace rollback
+    la versión tampoco cambia.
+    """
+    pendientes = _pendientes.get()
+    if pendientes is not None:
+        pendientes.update(claves)
+        return
+    for clave in set(claves):
+        if VersionRecurso.objects.filter(clave=clave).update(version=F('version') + 1):
+            continue
+        try:
+            with transaction.atomic():
+                VersionRecurso.objects.create(clave=clave)
+        except IntegrityError:
+            # Otro proceso la creó entre el UPDATE y el INSERT
+            VersionRecurso.objects.filter(clave=clave).update(version=F('version') + 1)
+
+
+@contextmanager
+def agrupar(silenciar_senales=False):
+    """
+    Junta los incrementos del bloque y los aplica una sola vez por clave al final.
+    Útil para operaciones masivas (borrados en cascada, archivado) que dispararían
+    una señal por fila. Con silenciar_senales=True las señales no calculan claves
+    (evita una consulta por fila) y quien llama debe pasar las claves a incrementar().
+    """
+    pendientes = set()
+    token = _pendientes.set(pendientes)
+    token_silencio = _silenciar_senales.set(silenciar_senales)
+    try:
+        yield
+    finally:
+        _pendientes.reset(token)
+        _silenciar_senales.reset(token_silencio)
+    incrementar(*pendientes)
+
+
+# --- Señales: cualquier cambio hecho con save()/delete() invalida el ETag ---
+# Las actualizaciones masivas con QuerySet.update() deben llamar a incrementar() explícitamente.
+
+def _catalogo_cambio(**kwargs):
+    if _silenciar_senales.get():
+        return
+    incrementar(SERVICIOS)
+
+
+def _anfitrion_cambio(sender, instance, created=False, update_fields=None, **kwargs):
+    # El catálogo muestra el nombre del anfitrión; guardar solo last_login (cada login) no lo cambia
+    if _silenciar_senales.get() or created:
+        return
+    if update_fields is not None and 'nombre' not in update_fields:
+        return
+    if Servicio.objects.filter(anfitrion_id=instance.pk).exists():
+        incrementar(SERVICIOS)
+
+
+def _estados_reserva_cambio(**kwargs):
+    if not _silenciar_senales.get():
+        incrementar(ESTADOS_RESERVA)
+
+
+def _carrito_cambio(sender, instance, **kwargs):
+    if _silenciar_senales.get():
+        return
+    if sender is Carrito:
+        usuario_id = instance.usuario_id
+    else:
+        usuario_id = Carrito.objects.filter(id=instance.carrito_id).values_list('usuario_id', flat=True).first()
+    if usuario_id:
+        incrementar(clave_carrito(usuario_id))
+
+
+def _reservas_cambio(sender, instance, **kwargs):
+    if _silenciar_senales.get():
+        return
+    if sender is Reserva:
+        usuario_id = instance.usuario_id
+    else:
+        usuario_id = Reserva.objects.filter(id=instance.reserva_id).values_list('usuario_id', flat=True).first()
+    if usuario_id:
+        incrementar(clave_reservas(usuario_id))
+
+
+for _modelo, _receptor in (
+    (Servicio, _catalogo_cambio),
+    (TipoServicio, _catalogo_cambio),
+    (Usuario, _anfitrion_cambio),
+    (EstadoReserva, _estados_reserva_cambio),
+    (Carrito, _carrito_cambio),
+    (DetalleCarrito, _carrito_cambio),
+    (Reserva, _reservas_cambio),
+    (DetalleReserva, _reservas_cambio),
+):
+    post_save.connect(_receptor, sender=_modelo, dispatch_uid=f'version_save_{_modelo.__name__}')
+    post_delete.connect(_receptor, sender=_modelo, dispatch_uid=f'version_delete_{_modelo.__name__}')
@@ -1,15 +1,24 @@
 # core/views.py
 
+import io
+
+from django.http import HttpResponseForbidden
 from django.shortcuts import redirect, render
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required 
 
 # Importa tus formularios, incluyendo el nuevo PerfilUsuarioForm
-from .forms import RegistroClienteForm, LoginForm, PerfilUsuarioForm
+from .forms import RegistroClienteForm, LoginForm, PerfilUsuarioForm, ImportarServiciosForm
 # Importa tus modelos Usuario y los necesarios para las reservas
 # Asegúrate de que 'Usuario' sea tu AUTH_USER_MODEL
 from .models import Usuario, TipoUsuario, Reserva, DetalleReserva, Servicio, TipoServicio, EstadoReserva
+# Las vistas de solo lectura pueden leer de una réplica (ver core/router.py)
+from .router import lectura_en_replica
+from .retencion import historial_archivado
+from .recomendaciones import sugerencias_carrito
+from .importacion import ArchivoInvalido, importar_servicios as importar_csv_servicios
+from .cola import encolar_muchos
 
 
 # Vista para la página de inicio pública
@@ -56,20 +65,24 @@ def inicioregistrado(request):
     return render(request, 'core/inicioregistrado.html')
 
 # Resto de tus vistas
+@lectura_en_replica
 def hospedaje(request):
-    return render (request, 'core/hospedaje.html')
+    return render (request, 'core/hospedaje.html', {'sugerencias': sugerencias_carrito(request.user)})
 
+@lectura_en_replica
 def actividad(request):
-    return render (request, 'core/actividad.html')
+    return render (request, 'core/actividad.html', {'sugerencias': sugerencias_carrito(request.user)})
 
+@lectura_en_replica
 def gastronomia(request):
-    return render (request, 'core/gastronomia.html')
+    return render (request, 'core/gastronomia.html', {'sugerencias': sugerencias_carrito(request.user)})
 
 def carrito(request):
-    return render (request, 'core/carrito.html')
+    return render (request, 'core/carrito.html', {'sugerencias': sugerencias_carrito(request.user)})
 
 
 @login_required(login_url='login') # Asegura que solo usuarios autenticados puedan acceder
+@lectura_en_replica # Tras guardar, el middleware fija la sesión a la primaria (read-your-writes)
 def perfil(request):
     usuario_actual = request.user
     form_submitted_with_errors = False # Para el JavaScript del frontend
@@ -121,15 +134,22 @@ def perfil(request):
                 'total': reserva.total,
             })
 
+    # El historial archivado solo se consulta si el usuario lo pide (?historial=1)
+    mostrar_historial = request.GET.get('historial') == '1'
+    if usuario_actual.is_cliente and mostrar_historial:
+        reservas_data.extend(historial_archivado(usuario_actual))
+
     context = {
         'form': form,
         'reservas': reservas_data, # Pasa las reservas procesadas
         'form_submitted': form_submitted_with_errors, # Pasa la bandera al template para el JS
+        'mostrar_historial': mostrar_historial,
         'user': usuario_actual, # Asegúrate de pasar el usuario al contexto
     }
     return render(request, 'core/perfil.html', context)
 
 @login_required
+@lectura_en_replica
 def listar_servicios_anfitrion(request):
     # Esta vista también necesitará un filtro por anfitrión
     # Por ejemplo: servicios = Servicio.objects.filter(anfitrion=request.user)
@@ -141,6 +161,7 @@ def listar_servicios_anfitrion(request):
     return render(request, 'core/listar_servicios_anfitrion.html', context)
 
 @login_required
+@lectura_en_replica
 def listar_reservas_anfitrion(request):
     # Aquí puedes filtrar las reservas para los servicios de este anfitrión
     # Ejemplo: reservas = Reserva.objects.filter(detallereserva__servicio__anfitrion=request.user).distinct()
@@ -149,4 +170,38 @@ def listar_reservas_anfitrion(request):
         'reservas': reservas_anfitrion,
         'user': request.user, # Pasa el usuario para el navbar
     }
-    return render(request, 'core/listar_reservas_anfitrion.html', context)
\ No newline at end of file
+    return render(request, 'core/listar_reservas_anfitrion.html', context)
+
+@login_required
+def importar_servicios(request):
+    # Carga masiva de servicios del anfitrión desde un CSV (ver core/importacion.py)
+    if not (request.user.is_anfitrion or request.user.is_administrador):
+        return HttpResponseForbidden('Solo los anfitriones pueden importar servicios.')
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarServiciosForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Se lee el archivo subido como texto, por lotes, sin cargarlo entero en memoria
+            archivo = io.TextIOWrapper(form.cleaned_data['archivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                resultado = importar_csv_servicios(archivo, request.user, miniaturas=False)
+            except ArchivoInvalido as e:
+                form.add_error('archivo', str(e))
+            else:
+                # Las miniaturas se generan en la cola de tareas para no demorar la respuesta
+                ids = list(resultado.con_imagen)
+                encolar_muchos('generar_miniaturas', [{'servicio_ids': ids[i:i + 500]} for i in range(0, len(ids), 500)])
+                messages.success(request, f'Servicios creados: {resultado.creados}. Actualizados: {resultado.actualizados}.')
+                if resultado.errores:
+                    messages.warning(request, f'{len(resultado.errores)} filas tenían errores y no se importaron.')
+                for aviso in resultado.avisos:
+                    messages.warning(request, aviso)
+    else:
+        form = ImportarServiciosForm()
+    context = {
+        'form': form,
+        'resultado': resultado,
+        'errores': resultado.errores[:200] if resultado else [], # Solo las primeras para no inflar la página
+        'user': request.user, # Pasa el usuario para el navbar
+    }
+    return render(request, 'core/importar_servicios.html', context)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware', # Fija la sesión a la primaria tras una escritura
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +85,24 @@ DATABASES = {
     }
 }
 
+# Réplicas de solo lectura (opcional). Cada réplica copia la configuración de 'default'
+# cambiando solo el NAME, así que sirve tanto para archivos SQLite como para bases PostgreSQL.
+# Ej: DB_REPLICAS=replica1.sqlite3,replica2.sqlite3 python manage.py runserver
+REPLICAS = []
+for _i, _nombre in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    _alias = f'replica{_i}'
+    _ruta = BASE_DIR / _nombre.strip() if DATABASES['default']['ENGINE'].endswith('sqlite3') else _nombre.strip()
+    DATABASES[_alias] = {**DATABASES['default'], 'NAME': _ruta, 'TEST': {'MIRROR': 'default'}}
+    REPLICAS.append(_alias)
+
+# Al correr las pruebas se agrega una réplica espejo de 'default' (TEST MIRROR: no crea otra base),
+# para probar el router sin configurar réplicas reales (ver core/tests.py)
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica_pruebas'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['core.router.RouterReplicas']
+REPLICA_FIJAR_SEGUNDOS = 10 # Segundos que una sesión lee de la primaria después de escribir
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +142,10 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static', # Asegúrate de que Django busque archivos estáticos aquí
 ]
 
+# Archivos subidos (imágenes de servicios y sus miniaturas)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -136,3 +161,8 @@ AUTH_USER_MODEL = 'core.Usuario'
 LOGIN_URL = 'login' # La URL a la que se redirige para iniciar sesión
 LOGIN_REDIRECT_URL = 'inicioregistrado' # La URL a la que se redirige después de un login exitoso
 LOGOUT_REDIRECT_URL = 'inicio' # La URL a la que se redirige después de un logout exitoso
+
+# Correo: en desarrollo los correos se imprimen en consola en vez de enviarse
+# (los envía la cola de tareas: python manage.py procesar_tareas)
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'Manakea Tours <no-responder@manakeatours.cl>'